@@ -1,6 +1,7 @@
-import io
+import datetime
 import os
-from typing import List, Optional, Union
+import time
+from typing import Dict, List, Optional, Union
 
 import duckdb
 import pandas as pd
@@ -64,12 +65,17 @@ class HuggingDuckDBConnection(BaseConnection[duckdb.DuckDBPyConnection]):
                 con.execute(f"""
                     CREATE TABLE IF NOT EXISTS {self.schema_name}.metadata (
                         file_name VARCHAR,
-                        file_size INTEGER,
+                        file_size BIGINT,
                         file_type VARCHAR,
-                        row_count INTEGER,
-                        is_loaded BOOLEAN
+                        row_count BIGINT,
+                        is_loaded BOOLEAN,
+                        bytes_downloaded BIGINT,
+                        load_seconds DOUBLE,
+                        throughput_mb_s DOUBLE,
+                        loaded_at TIMESTAMP
                     );
                 """)
+                self._migrate_metadata(con)  # An older metadata table is kept by IF NOT EXISTS
                 # Load metadata and (optionally) data for all files in the repo
                 self._load_all_datasets(con, repo_id, file_filters)
             else:
@@ -77,6 +83,7 @@ class HuggingDuckDBConnection(BaseConnection[duckdb.DuckDBPyConnection]):
                 con.execute(
                     f"SET search_path = '{self.schema_name}';"
                 )  # Set schema as the default
+                self._migrate_metadata(con)
                 logger.info(
                     f"Using existing database.  Skipping data load from Hugging Face.  To force reload, set force_recreate=True"
                 )
@@ -86,6 +93,38 @@ class HuggingDuckDBConnection(BaseConnection[duckdb.DuckDBPyConnection]):
             st.error(f"Connection error: {e}")
             raise
 
+    def _migrate_metadata(self, con: duckdb.DuckDBPyConnection):
+        """Brings the metadata tables of an older database up to date.
+
+        Adds the download telemetry columns, then widens the counters of databases created with 32-bit file
+        sizes and row counts, and creates the column statistics table if the database predates it.
+        """
+        for column, column_type in (
+            ("bytes_downloaded", "BIGINT"),
+            ("load_seconds", "DOUBLE"),
+            ("throughput_mb_s", "DOUBLE"),
+            ("loaded_at", "TIMESTAMP"),
+        ):
+            con.execute(
+                f"ALTER TABLE {self.schema_name}.metadata ADD COLUMN IF NOT EXISTS {column} {column_type};"
+            )
+        for column in ("file_size", "row_count"):
+            con.execute(
+                f"ALTER TABLE {self.schema_name}.metadata ALTER COLUMN {column} TYPE BIGINT;"
+            )
+        con.execute(f"""
+            CREATE TABLE IF NOT EXISTS {self.schema_name}.column_stats (
+                table_name VARCHAR,
+                column_name VARCHAR,
+                column_type VARCHAR,
+                min_value VARCHAR,
+                max_value VARCHAR,
+                null_count BIGINT,
+                approx_distinct BIGINT,
+                mean DOUBLE
+            );
+        """)
+
     def _load_all_datasets(
         self,
         con: duckdb.DuckDBPyConnection,
@@ -97,56 +136,167 @@ class HuggingDuckDBConnection(BaseConnection[duckdb.DuckDBPyConnection]):
             repo_id, file_filters
         )  # Get filtered list of files
 
+        # Get all file sizes from the Hub in one batched call, rather than re-reading each file
+        file_sizes = self.get_file_sizes(repo_id, files)
+
+        records = []  # Metadata rows, written in one batch once all files are loaded
         for file in files:
             try:
+                start = time.perf_counter()
                 file_path = f"hf://datasets/{repo_id}/{file}"
                 table_name = os.path.splitext(os.path.basename(file))[0]
 
-                # Load data into a Pandas DataFrame
-                df = con.execute(f"SELECT * FROM '{file_path}'").fetchdf()
-
-                # Serialize to CSV using StringIO
-                csv_buffer = io.StringIO()  # Commented out: Not needed for row count
-                df.to_csv(
-                    csv_buffer, index=False
-                )  # Commented out: Not needed for row count
-                csv_string = (
-                    csv_buffer.getvalue()
-                )  # Commented out: Not needed for row count
-
-                # Get file size
-                file_size = len(
-                    csv_string.encode("utf-8")
-                )  # Get size in bytes # Commented out: Not needed for row count
-
-                # Create table for the data, and load the data set
-                con.execute(
+                # Create table for the data and load the data set in a single read of the remote file.
+                # CREATE TABLE AS returns the number of rows inserted, so no second scan is needed for the count.
+                result = con.execute(
                     f"CREATE TABLE IF NOT EXISTS {self.schema_name}.{table_name} AS SELECT * FROM '{file_path}'"
+                ).fetchone()
+                if result is None:  # The table already existed, so nothing was loaded
+                    result = con.execute(
+                        f"SELECT count(*) FROM {self.schema_name}.{table_name}"
+                    ).fetchone()
+                row_count = result[0]
+
+                # Collect column statistics from the local table (not the remote file)
+                self._collect_column_stats(con, table_name)
+
+                # Get file size and download telemetry
+                file_size = file_sizes.get(file, 0)
+                load_seconds = time.perf_counter() - start
+                throughput_mb_s = (
+                    file_size / load_seconds / 1e6 if load_seconds > 0 else None
+                )
+                loaded_at = datetime.datetime.now(datetime.timezone.utc).replace(
+                    tzinfo=None
                 )
-
-                # Get row count using SQL query
-                row_count = con.execute(
-                    f"SELECT count(*) FROM {self.schema_name}.{table_name}"
-                ).fetchone()[0]
 
                 # Get file type
                 file_type = file.split(".")[-1].lower()
 
-                # Add metadata
-                con.execute(f"""
-                    INSERT INTO {self.schema_name}.metadata (file_name, file_size, file_type, row_count, is_loaded)
-                    VALUES ('{file}', {file_size}, '{file_type}', {row_count}, TRUE);
-                """)
+                records.append(
+                    (
+                        file,
+                        file_size,
+                        file_type,
+                        row_count,
+                        True,
+                        file_size,
+                        load_seconds,
+                        throughput_mb_s,
+                        loaded_at,
+                    )
+                )
                 logger.info(
                     f"Loaded dataset into table: {self.schema_name}.{table_name}"
                 )
 
             except Exception as e:
                 st.error(f"Error loading dataset {file}: {e}")
-                con.execute(f"""
-                    INSERT INTO {self.schema_name}.metadata (file_name, file_size, file_type, row_count, is_loaded)
-                    VALUES ('{file}', 0, 'unknown', 0, FALSE);
-                """)
+                records.append(
+                    (file, 0, "unknown", 0, False, None, None, None, None)
+                )
+
+        if not records:
+            return  # No files to record (executemany needs at least one row)
+
+        # Add metadata for all files in a single transaction.  The loads themselves stay outside it, so that
+        # a file that fails to load does not abort the metadata of the others.
+        con.execute("BEGIN TRANSACTION;")
+        try:
+            con.executemany(
+                f"""
+                INSERT INTO {self.schema_name}.metadata (file_name, file_size, file_type, row_count, is_loaded,
+                    bytes_downloaded, load_seconds, throughput_mb_s, loaded_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?);
+            """,
+                records,
+            )
+            con.execute("COMMIT;")
+        except Exception:
+            con.execute("ROLLBACK;")
+            raise
+
+    def _collect_column_stats(self, con: duckdb.DuckDBPyConnection, table_name: str):
+        """Records the min, max, null count, approximate distinct count and mean of every column of a table.
+
+        All the statistics are computed by a single aggregate query, so the table is scanned once.
+        """
+        columns = con.execute(
+            """
+            SELECT column_name, data_type FROM duckdb_columns()
+            WHERE schema_name = ? AND table_name = ?
+            ORDER BY column_index;
+        """,
+            [self.schema_name, table_name],
+        ).fetchall()
+        aggregates = []
+        for column_name, column_type in columns:
+            column = '"' + column_name.replace('"', '""') + '"'
+            is_numeric = column_type.startswith("DECIMAL") or column_type in (
+                "TINYINT",
+                "SMALLINT",
+                "INTEGER",
+                "BIGINT",
+                "HUGEINT",
+                "FLOAT",
+                "DOUBLE",
+            )
+            mean = f"avg({column})::DOUBLE" if is_numeric else "NULL"
+            aggregates.append(
+                f"min({column})::VARCHAR, max({column})::VARCHAR, count(*) - count({column}), "
+                f"approx_count_distinct({column}), {mean}"
+            )
+        values = con.execute(
+            f"SELECT {', '.join(aggregates)} FROM {self.schema_name}.{table_name}"
+        ).fetchone()
+
+        con.execute(
+            f"DELETE FROM {self.schema_name}.column_stats WHERE table_name = ?;",
+            [table_name],
+        )
+        con.executemany(
+            f"INSERT INTO {self.schema_name}.column_stats VALUES (?, ?, ?, ?, ?, ?, ?, ?);",
+            [
+                [table_name, column_name, column_type, *values[i * 5 : i * 5 + 5]]
+                for i, (column_name, column_type) in enumerate(columns)
+            ],
+        )
+
+    def get_column_stats(self, table_name: Optional[str] = None) -> pd.DataFrame:
+        """Returns the column statistics recorded at load time, so profiles need no scan of the tables.
+
+        Args:
+            table_name (str, optional): The table to return the statistics of. Defaults to None (all tables).
+
+        Returns:
+            pd.DataFrame: The statistics of each column.
+        """
+        sql = f"SELECT * FROM {self.schema_name}.column_stats"
+        if table_name is None:
+            return self._instance.execute(f"{sql} ORDER BY table_name").fetchdf()
+        return self._instance.execute(
+            f"{sql} WHERE table_name = ?", [table_name]
+        ).fetchdf()
+
+    def get_file_sizes(self, repo_id: str, files: List[str]) -> Dict[str, int]:
+        """Gets the sizes of files in a Hugging Face dataset repository from the Hub, in one batched call.
+
+        Args:
+            repo_id (str): The Hugging Face repository ID (e.g., "mjboothaus/titanic-databooth").
+            files (List[str]): The file names to look up.
+
+        Returns:
+            Dict[str, int]: A mapping of file name to size in bytes (empty on error).
+        """
+        if not files:
+            return {}
+        try:
+            api = HfApi()
+            paths_info = api.get_paths_info(repo_id, files, repo_type="dataset")
+            return {info.path: info.size for info in paths_info}
+        except Exception as e:
+            logger.error(f"Error getting file sizes from the Hub: {e}")
+            return {}
 
     def query(self, sql: str, ttl: int = 3600, **kwargs) -> pd.DataFrame:
         """
@@ -205,10 +355,11 @@ class HuggingDuckDBConnection(BaseConnection[duckdb.DuckDBPyConnection]):
             return []
 
     def get_table_names(self, exclude_metadata: bool = True) -> List[str]:
-        """Retrieves the table names from the DuckDB connection, optionally excluding the metadata table.
+        """Retrieves the table names from the DuckDB connection, optionally excluding the metadata tables.
 
         Args:
-            exclude_metadata (bool, optional): Whether to exclude the metadata table from the results. Defaults to True.
+            exclude_metadata (bool, optional): Whether to exclude the metadata and column_stats tables from the results.
+                Defaults to True.
 
         Returns:
             List[str]: A list of table names in the database.
@@ -218,7 +369,11 @@ class HuggingDuckDBConnection(BaseConnection[duckdb.DuckDBPyConnection]):
             # Get the table names from the current schema
             table_names = con.execute("SHOW TABLES").fetchdf()["name"].tolist()
             if exclude_metadata:
-                table_names = [name for name in table_names if name != "metadata"]
+                table_names = [
+                    name
+                    for name in table_names
+                    if name not in ("metadata", "column_stats")
+                ]
             return table_names
         except Exception as e:
             st.error(f"Error retrieving table names: {e}")
@@ -258,5 +413,6 @@ if __name__ == "__main__":
         try:
             metadata = conn.query(f"SELECT * FROM {conn.schema_name}.metadata")
             st.write("Metadata:", metadata)
+            st.write("Column statistics:", conn.get_column_stats())
         except Exception as e:
             st.error(f"Error fetching metadata: {e}")
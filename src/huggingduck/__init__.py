@@ -1,3 +1,9 @@
+from .cache import FileCache, ResultCache
 from .connection import HuggingDuckDBConnection, HuggingDuckDBStConnection
 
-__all__ = ["HuggingDuckDBConnection", "HuggingDuckDBStConnection"]
+__all__ = [
+    "FileCache",
+    "ResultCache",
+    "HuggingDuckDBConnection",
+    "HuggingDuckDBStConnection",
+]
@@ -0,0 +1,235 @@
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from loguru import logger
+
+
+class FileCache:
+    """
+    Content-addressed cache of downloaded repo files, bounded by a disk budget with LRU eviction.
+
+    Files are stored as <cache_dir>/<key[:2]>/<key><suffix>, keyed by their LFS oid (or git blob id), so
+    the same content is only downloaded once per host, whichever process or container asks for it.
+    Recency is tracked through file modification times, which makes the LRU order visible to every
+    process sharing the directory.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 10 * 1024**3):
+        """
+        Initializes the cache, creating the cache directory if needed.
+
+        Args:
+            cache_dir (str): Directory holding the cached files.
+            max_bytes (int, optional): Disk budget for the cache in bytes. Defaults to 10 GiB.
+        """
+        self.cache_dir = Path(cache_dir).expanduser()
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def path(self, key: str, suffix: str = "") -> str:
+        """Returns the path a file with the given key is (or would be) cached at."""
+        return str(self.cache_dir / key[:2] / f"{key}{suffix}")
+
+    def contains(self, key: str, suffix: str = "") -> bool:
+        """Checks whether a file is cached, without counting a hit or miss."""
+        return os.path.exists(self.path(key, suffix))
+
+    def get(self, key: str, suffix: str = "") -> Optional[str]:
+        """
+        Looks up a cached file, marking it as recently used.
+
+        Args:
+            key (str): The content hash of the file.
+            suffix (str, optional): The file's extension(s), e.g. ".csv". Defaults to "".
+
+        Returns:
+            Optional[str]: The path of the cached file, or None on a miss.
+        """
+        path = self.path(key, suffix)
+        try:
+            os.utime(path)  # Mark as recently used
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return path
+
+    def put(self, key: str, source_path: str, suffix: str = "") -> str:
+        """
+        Moves a file into the cache, then evicts least recently used files to stay within the budget.
+
+        The move is atomic, so concurrent readers never see a partially written file.
+
+        Args:
+            key (str): The content hash of the file.
+            source_path (str): The file to move into the cache (ideally on the same filesystem).
+            suffix (str, optional): The file's extension(s), e.g. ".csv". Defaults to "".
+
+        Returns:
+            str: The path of the cached file.
+        """
+        path = self.path(key, suffix)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        shutil.move(source_path, tmp_path)
+        os.replace(tmp_path, path)
+        self.evict(keep=path)
+        return path
+
+    def evict(self, keep: Optional[str] = None):
+        """
+        Deletes least recently used files until the cache fits in its disk budget.
+
+        Args:
+            keep (str, optional): A path that must not be evicted (e.g. a file that was just added).
+        """
+        entries = []
+        for path in self.cache_dir.glob("??/*"):
+            if path.name.endswith(".tmp"):
+                continue  # Another writer's file in flight
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue  # Evicted by another process
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if str(path) == keep:
+                continue
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            total -= size
+            with self._lock:
+                self.evictions += 1
+            logger.debug(f"Evicted cached file: {path}")
+
+    def size(self) -> int:
+        """Returns the total size of the cached files in bytes."""
+        total = 0
+        for path in self.cache_dir.glob("??/*"):
+            try:
+                total += path.stat().st_size
+            except FileNotFoundError:
+                pass
+        return total
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Returns the cache's counters for this process, along with its current size.
+
+        Returns:
+            Dict[str, float]: The hits, misses, hit_rate, evictions, bytes and max_bytes of the cache.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "bytes": self.size(),
+                "max_bytes": self.max_bytes,
+            }
+
+
+class ResultCache:
+    """
+    In-process LRU cache of query results, bounded by the in-memory size of the cached results.
+    """
+
+    def __init__(self, max_bytes: int):
+        """
+        Initializes an empty cache.
+
+        Args:
+            max_bytes (int): Memory budget for the cached results in bytes.
+        """
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[Hashable, Tuple[Any, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Looks up a cached result, marking it as recently used.
+
+        Args:
+            key (Hashable): The cache key of the result.
+
+        Returns:
+            Optional[Any]: The cached result, or None on a miss.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, value: Any, nbytes: int):
+        """
+        Caches a result, then evicts least recently used results to stay within the budget.
+
+        Results larger than the whole budget are not cached.
+
+        Args:
+            key (Hashable): The cache key of the result.
+            value (Any): The result to cache.
+            nbytes (int): The in-memory size of the result in bytes.
+        """
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self.bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, nbytes)
+            self.bytes += nbytes
+            while self.bytes > self.max_bytes:
+                _, (_, evicted_bytes) = self._entries.popitem(last=False)
+                self.bytes -= evicted_bytes
+                self.evictions += 1
+
+    def clear(self):
+        """Drops all cached results (the counters are kept)."""
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Returns the cache's counters along with its current size.
+
+        Returns:
+            Dict[str, float]: The hits, misses, hit_rate, evictions, entries, bytes and max_bytes of the cache.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+            }
@@ -1,167 +1,2386 @@
+import asyncio
+import contextlib
+import datetime
+import decimal
+import glob
+import hashlib
+import itertools
+import json
 import os
-from typing import List, Optional, Union
+import re
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
 
 import duckdb
 import pandas as pd
+import pyarrow as pa
 import streamlit as st
-from huggingface_hub import HfApi
+from huggingface_hub import HfApi, hf_hub_download
 from loguru import logger
 from streamlit.connections import BaseConnection
 
+from .cache import FileCache, ResultCache
+
+# Columns of the metadata table, in creation order.  New columns are added to existing
+# databases with ALTER TABLE so that older .duckdb files keep working, and columns created
+# with a narrower type (INTEGER counters before 64-bit sizes and row counts) are widened.
+METADATA_COLUMNS = {
+    "file_name": "VARCHAR",
+    "table_name": "VARCHAR",
+    "file_size": "BIGINT",
+    "file_type": "VARCHAR",
+    "row_count": "BIGINT",
+    "is_loaded": "BOOLEAN",
+    "load_seconds": "DOUBLE",
+    "commit_sha": "VARCHAR",
+    "blob_id": "VARCHAR",
+    "lfs_oid": "VARCHAR",
+    "bytes_downloaded": "BIGINT",
+    "throughput_mb_s": "DOUBLE",
+    "loaded_at": "TIMESTAMP",
+    "revision": "VARCHAR",
+    "original_types": "STRUCT(column_name VARCHAR, original_type VARCHAR, new_type VARCHAR)[]",
+    "sample": "VARCHAR",
+    "sample_rate": "DOUBLE",
+    "reader": "VARCHAR",
+}
+
+# Branch where the Hub publishes its Parquet conversion of a dataset repo, as <config>/<split>/<shard>.parquet
+PARQUET_BRANCH = "refs/convert/parquet"
+
+# Revision recorded for the splits loaded from the local datasets Arrow cache, whose file names are local paths
+DATASETS_CACHE = "datasets-cache"
+
+# Default directory of the datasets library's Arrow cache (overridden by the HF_DATASETS_CACHE variable)
+DATASETS_CACHE_DIR = "~/.cache/huggingface/datasets"
+
+# Repo commit in the URLs of the datasets cache's download checksums, e.g. hf://datasets/<repo>@<sha>/<file>
+_CACHED_COMMIT = re.compile(r"@([0-9a-f]{40})/")
+
+# Columns of the column_stats catalog, which holds per-column statistics of each loaded table
+COLUMN_STATS_COLUMNS = {
+    "table_name": "VARCHAR",
+    "column_name": "VARCHAR",
+    "column_type": "VARCHAR",
+    "min_value": "VARCHAR",
+    "max_value": "VARCHAR",
+    "null_count": "BIGINT",
+    "approx_distinct": "BIGINT",
+    "mean": "DOUBLE",
+}
+
+# Columns of the column_histograms catalog: fixed-width bins of each numeric column, where a bin
+# holds the values in (lower_bound, upper_bound] (the first bin also holds lower_bound itself)
+COLUMN_HISTOGRAMS_COLUMNS = {
+    "table_name": "VARCHAR",
+    "column_name": "VARCHAR",
+    "bin_index": "INTEGER",
+    "lower_bound": "DOUBLE",
+    "upper_bound": "DOUBLE",
+    "count": "BIGINT",
+}
+
+# Columns of the column_quantiles catalog: approximate quantiles of each numeric column
+COLUMN_QUANTILES_COLUMNS = {
+    "table_name": "VARCHAR",
+    "column_name": "VARCHAR",
+    "quantile": "DOUBLE",
+    "value": "DOUBLE",
+}
+
+# Catalog tables kept next to the metadata table, with one or more rows per loaded table
+CATALOG_TABLES = {
+    "column_stats": COLUMN_STATS_COLUMNS,
+    "column_histograms": COLUMN_HISTOGRAMS_COLUMNS,
+    "column_quantiles": COLUMN_QUANTILES_COLUMNS,
+}
+
+# Columns of the csv_schemas manifest: the dialect and column types sniffed from each CSV file, keyed by
+# the file's content hash (LFS oid or blob id), so later loads can read it without sniffing again
+CSV_SCHEMAS_COLUMNS = {
+    "file_hash": "VARCHAR",
+    "delimiter": "VARCHAR",
+    "quote": "VARCHAR",
+    "escape": "VARCHAR",
+    "new_line": "VARCHAR",
+    "skip_rows": "BIGINT",
+    "has_header": "BOOLEAN",
+    "columns": "STRUCT(name VARCHAR, type VARCHAR)[]",
+    "date_format": "VARCHAR",
+    "timestamp_format": "VARCHAR",
+    "sniffed_at": "TIMESTAMP",
+}
+
+# Values sniff_csv reports for an empty quote or escape: "(empty)", or a NUL character on older DuckDB versions
+_CSV_EMPTY_OPTIONS = ("(empty)", "\x00")
+
+# Quantiles recorded in the column_quantiles catalog
+QUANTILES = (0.01, 0.05, 0.1, 0.25, 0.5, 0.75, 0.9, 0.95, 0.99)
+
+# Base name of one shard of a sharded file, e.g. train-00000-of-00010.parquet (optionally with a hash suffix
+# after the shard count, as in train-00000-of-00010-1a2b3c.parquet)
+_SHARD_FILE = re.compile(
+    r"^(?P<name>.+)-\d{5}-of-(?P<count>\d{5})(?:-[^./]+)?(?P<ext>(?:\.[A-Za-z0-9]+)+)$"
+)
+
+# Options of DuckDB's multi-file readers, for the glob path of a group of files loaded as one table
+_MULTI_FILE_OPTIONS = "hive_partitioning = true, union_by_name = true"
+
+# Separator of the files of a list loaded as one table (a dataset card split listing several files), in its name
+_FILE_LIST_SEPARATOR = " + "
+
+# File formats by extension, which select the reader of a file (see HuggingDuckDBConnection._reader)
+_FILE_FORMATS = {
+    ".csv": "csv",
+    ".tsv": "csv",
+    ".json": "json",
+    ".jsonl": "jsonl",
+    ".ndjson": "jsonl",
+    ".parquet": "parquet",
+    ".arrow": "arrow",
+    ".feather": "arrow",
+    ".ipc": "arrow",
+    ".zip": "zip",
+}
+
+# Compression extensions that DuckDB's readers decompress while streaming the file
+_COMPRESSION_SUFFIXES = (".gz", ".zst", ".zstd")
+
+# Formats read through Python rather than by DuckDB from a path, which need a local copy of the file
+# and cannot back a lazy view
+_LOCAL_FORMATS = ("arrow", "zip")
+
+# Integer types that type compaction narrows columns to, smallest first, with the range each one holds.  Only
+# signed types, as arithmetic on unsigned ones wraps or overflows (e.g. -x, or a - b when b > a).
+_COMPACT_INTEGER_TYPES = [
+    ("TINYINT", -(2**7), 2**7 - 1),
+    ("SMALLINT", -(2**15), 2**15 - 1),
+    ("INTEGER", -(2**31), 2**31 - 1),
+]
+
+# In-memory width in bytes of the integer types, to tell whether a compact type is narrower
+_INTEGER_TYPE_BYTES = {
+    "TINYINT": 1,
+    "UTINYINT": 1,
+    "SMALLINT": 2,
+    "USMALLINT": 2,
+    "INTEGER": 4,
+    "UINTEGER": 4,
+    "BIGINT": 8,
+    "UBIGINT": 8,
+    "HUGEINT": 16,
+    "UHUGEINT": 16,
+}
+
+# Column types whose mean, histogram and quantiles are recorded in the catalog
+_NUMERIC_TYPE = re.compile(
+    r"^(U?(TINYINT|SMALLINT|INTEGER|BIGINT|HUGEINT)|FLOAT|DOUBLE|DECIMAL.*)$"
+)
+
+
+# Positional (sequence) or named (dict) query parameters
+QueryParams = Union[Sequence[Any], Dict[str, Any]]
+
+
+def _sql_literal(value: Any) -> str:
+    """Renders a query parameter as a SQL literal, for the arguments of an EXECUTE statement.
+
+    Raises:
+        TypeError: If the value has no literal form here (such values are bound without a prepared statement).
+    """
+    if value is None:
+        return "NULL"
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, decimal.Decimal):
+        if not value.is_finite():
+            raise TypeError(f"No SQL literal for the non-finite decimal {value}")
+        # Cast to the DECIMAL type binding gives it, as the type of a bare literal depends on how it is written
+        sign, digits, exponent = value.as_tuple()
+        scale = max(-exponent, 0)
+        width = max(len(digits) + exponent, 1) + scale
+        if width > 38:
+            raise TypeError(f"No SQL literal for the decimal {value}, wider than DECIMAL(38)")
+        return f"'{value:f}'::DECIMAL({width},{scale})"
+    if isinstance(value, float):
+        # Cast, as a bare literal is a DECIMAL whose type depends on the value, whereas a bound float is a DOUBLE
+        finite = value == value and abs(value) != float("inf")
+        return f"{value!r}::DOUBLE" if finite else f"'{value}'::DOUBLE"
+    if isinstance(value, str):
+        return "'" + value.replace("'", "''") + "'"
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is not None and value.utcoffset() is not None:
+            return f"TIMESTAMPTZ '{value.isoformat(sep=' ')}'"
+        return f"TIMESTAMP '{value.isoformat(sep=' ')}'"
+    if isinstance(value, datetime.date):
+        return f"DATE '{value.isoformat()}'"
+    raise TypeError(f"No SQL literal for parameter of type {type(value).__name__}")
+
+
+# Statements that only read data, and so may be served from the result cache
+_READ_ONLY_SQL = re.compile(
+    r"^\s*(SELECT|WITH|FROM|VALUES|TABLE|SHOW|DESCRIBE|SUMMARIZE|PIVOT|UNPIVOT)\b",
+    re.IGNORECASE,
+)
+
+
+def _quote_identifier(name: str) -> str:
+    """Quotes a column name for use in SQL."""
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _normalize_sql(sql: str) -> str:
+    """Collapses whitespace outside string literals and quoted identifiers, and drops a trailing semicolon."""
+    parts = re.split(r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\")", sql.strip().rstrip(";"))
+    return "".join(
+        part if index % 2 else re.sub(r"\s+", " ", part)
+        for index, part in enumerate(parts)
+    ).strip()
+
+
+def _load_telemetry(
+    file_size: Optional[int], bytes_downloaded: int, load_seconds: float
+) -> Dict[str, Any]:
+    """Returns the download telemetry metadata for a completed load (throughput in MB/s, loaded_at in UTC)."""
+    return {
+        "bytes_downloaded": bytes_downloaded,
+        "load_seconds": load_seconds,
+        "throughput_mb_s": (
+            file_size / load_seconds / 1e6 if file_size and load_seconds > 0 else None
+        ),
+        "loaded_at": datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None),
+    }
+
+
+def _group_file_info(
+    files: Dict[str, Dict[str, Any]], group_files: List[str], **info: Any
+) -> Dict[str, Any]:
+    """Combines the Hub file info of a group of files loaded as one table.
+
+    The group's blob_id is a digest of its files' ids, so refresh() reloads the table when any file changes.
+    """
+    digest = hashlib.sha256()
+    for file in sorted(group_files):
+        digest.update(
+            f"{file}:{files[file]['lfs_oid'] or files[file]['blob_id']}\n".encode()
+        )
+    return {
+        "file_size": sum(files[file]["file_size"] or 0 for file in group_files),
+        "blob_id": digest.hexdigest(),
+        "lfs_oid": None,
+        **info,
+    }
+
+
+def _file_format(path: str) -> Optional[str]:
+    """Returns the format of a file from its extension, ignoring a compression extension (None if unknown)."""
+    suffixes = [suffix.lower() for suffix in Path(path).suffixes]
+    if suffixes and suffixes[-1] in _COMPRESSION_SUFFIXES:
+        suffixes.pop()
+    return _FILE_FORMATS.get(suffixes[-1]) if suffixes else None
+
+
+def _read_arrow_ipc(path: str) -> pa.Table:
+    """Reads an Arrow IPC file (file or streaming format, as written by datasets) through a memory map."""
+    source = pa.memory_map(path)
+    try:
+        return pa.ipc.open_file(source).read_all()
+    except pa.ArrowInvalid:
+        source.seek(0)
+        return pa.ipc.open_stream(source).read_all()
+
+
+def _read_arrow_files(path: str) -> pa.Table:
+    """Reads an Arrow IPC file, or a glob of shards concatenated in order, through memory maps."""
+    paths = sorted(glob.glob(path)) if "*" in path else [path]
+    return pa.concat_tables([_read_arrow_ipc(shard) for shard in paths])
+
+
+def _filter_files(
+    files: List[str], file_filters: Union[str, List[str]] = None
+) -> List[str]:
+    """Returns the files ending in one of the given extensions (all files if there are no filters)."""
+    if not file_filters:
+        return list(files)  # No filter, return all files
+    if isinstance(file_filters, str):
+        file_filters = [file_filters]  # Convert to a list if it's a single string
+    return [
+        file
+        for file in files
+        if any(file.endswith(f".{file_filter}") for file_filter in file_filters)
+    ]
+
+
+def _card_data_files(data_files: Any) -> Dict[str, List[str]]:
+    """Returns the path patterns of each split of a dataset card config, from its data_files.
+
+    data_files is a pattern or a list of patterns (all of the "train" split), a list of {"split": ..., "path": ...}
+    entries whose path is a pattern or a list of them, or a mapping of split to patterns.
+    """
+    if isinstance(data_files, str):
+        data_files = [data_files]
+    elif isinstance(data_files, dict):
+        data_files = (
+            [data_files]
+            if "path" in data_files
+            else [{"split": split, "path": path} for split, path in data_files.items()]
+        )
+    splits: Dict[str, List[str]] = {}
+    for entry in data_files or []:
+        split, paths = (
+            (entry.get("split", "train"), entry.get("path"))
+            if isinstance(entry, dict)
+            else ("train", entry)
+        )
+        splits.setdefault(split, []).extend([paths] if isinstance(paths, str) else paths or [])
+    return splits
+
+
+def _matches_pattern(file: str, pattern: str) -> bool:
+    """Checks whether a repo file matches a data_files pattern: a glob, where * stays within a directory and
+    ** spans directories, or a file or directory path."""
+    pattern = pattern.removeprefix("./")
+    if "*" not in pattern and "?" not in pattern:
+        return file == pattern or file.startswith(f"{pattern.rstrip('/')}/")
+    regex = "".join(
+        {"**/": "(?:.*/)?", "**": ".*", "*": "[^/]*", "?": "[^/]"}.get(part, re.escape(part))
+        for part in re.split(r"(\*\*/|\*\*|\*|\?)", pattern)
+    )
+    return re.fullmatch(regex, file) is not None
+
 
 class HuggingDuckDBConnection:
     """
     Core class for interacting with Hugging Face datasets in DuckDB, without Streamlit dependencies.
     """
 
-    def __init__(
-        self,
-        repo_id: str,
-        db_path: Optional[str] = None,
-        file_filters: Union[str, List[str]] = None,
-        force_recreate: bool = False,
+    def __init__(
+        self,
+        repo_id: str,
+        db_path: Optional[str] = None,
+        file_filters: Union[str, List[str]] = None,
+        force_recreate: bool = False,
+        max_workers: Optional[int] = None,
+        lazy: bool = False,
+        cache_dir: Optional[str] = None,
+        cache_max_bytes: int = 10 * 1024**3,
+        prepared_cache_size: int = 128,
+        result_cache_bytes: Optional[int] = None,
+        threads: Optional[int] = None,
+        async_max_concurrency: int = 4,
+        column_stats: bool = True,
+        histograms: bool = False,
+        histogram_bins: int = 20,
+        parquet_cache: bool = False,
+        parquet_row_group_size: int = 122_880,
+        parquet_branch: bool = False,
+        schema_manifest: bool = True,
+        compact_types: bool = False,
+        enum_max_values: int = 256,
+        table_specs: Optional[Dict[str, Dict[str, Any]]] = None,
+        sample_rows: Optional[int] = None,
+        sample_percent: Optional[float] = None,
+        sample_method: str = "random",
+        sample_seed: int = 42,
+        group_files: bool = True,
+        datasets_cache: bool = False,
+        datasets_cache_dir: Optional[str] = None,
+        configs: Optional[List[str]] = None,
+    ):
+        """
+        Initializes the HuggingDuckDBConnection connection.
+
+        Args:
+            repo_id (str): Hugging Face repository ID (e.g., "mjboothaus/titanic-databooth").
+            db_path (str, optional): Path to the .duckdb file for persistence. Defaults to None (in-memory).
+            file_filters (Union[str, List[str]], optional): File extensions to filter by. Defaults to None.
+            force_recreate (bool, optional): Whether to force recreation of the database. Defaults to False.
+            max_workers (int, optional): Number of files to ingest in parallel, each on its own cursor.
+                Defaults to None (load files one at a time).
+            lazy (bool, optional): Whether to register each file as a view over its hf:// path and only
+                materialize it as a local table the first time it is queried. Defaults to False.
+            cache_dir (str, optional): Directory for a local content-addressed cache of downloaded files, shared
+                by every process on the host. Defaults to None (read files directly from hf://).
+            cache_max_bytes (int, optional): Disk budget for the file cache, enforced with LRU eviction.
+                Defaults to 10 GiB.
+            prepared_cache_size (int, optional): Number of prepared statements kept for parameterized queries,
+                keyed by SQL text. Defaults to 128.
+            result_cache_bytes (int, optional): Memory budget for an in-process LRU cache of query results,
+                keyed by normalized SQL, parameters and dataset version. Defaults to None (no result cache).
+            threads (int, optional): Size of DuckDB's worker pool, which is shared by the queries of every thread's
+                cursor. Defaults to None (DuckDB's default of one per core).
+            async_max_concurrency (int, optional): Maximum number of async calls (aquery, aquery_arrow, ...) running
+                at once; further calls wait for a free worker. Defaults to 4.
+            column_stats (bool, optional): Whether to record the min, max, null count, approximate distinct count
+                and mean of every column in the column_stats catalog as each table is loaded. Defaults to True.
+            histograms (bool, optional): Whether to also record a fixed-width histogram and approximate quantiles
+                of every numeric column as each table is loaded. Defaults to False.
+            histogram_bins (int, optional): Number of bins of each histogram. Defaults to 20.
+            parquet_cache (bool, optional): Whether the file cache stores CSV files as zstd-compressed Parquet,
+                converted once when they are first downloaded, so that later loads skip CSV parsing. Requires
+                cache_dir. Defaults to False.
+            parquet_row_group_size (int, optional): Rows per row group of the converted Parquet files; DuckDB
+                scans row groups in parallel. Defaults to 122,880 (DuckDB's own row group size).
+            parquet_branch (bool, optional): Whether to load the Hub's Parquet conversion of the repo (from the
+                refs/convert/parquet branch) when it exists, with one table per config and split, rather than the
+                raw files. Falls back to the raw files if there is no conversion. Defaults to False.
+            schema_manifest (bool, optional): Whether to record the dialect and column types sniffed from each CSV
+                file in the csv_schemas table, keyed by the file's hash, and read the file with them explicitly
+                from then on, so reloads skip sniffing and keep the same types. Defaults to True.
+            compact_types (bool, optional): Whether to convert the columns of each loaded table to more compact
+                types: low-cardinality strings to ENUMs and integers to the smallest signed type that holds their
+                values.
+                The original types are recorded in the metadata. Defaults to False.
+            enum_max_values (int, optional): Maximum number of distinct values of a string column converted to an
+                ENUM. Defaults to 256.
+            table_specs (Dict[str, Dict[str, Any]], optional): Ingest specifications by table name, each with any of
+                "columns" (the list of columns to keep), "where" (a SQL predicate rows must satisfy) and "limit"
+                (the maximum number of rows).  They are applied in the read of the file, so projection and filter
+                pushdown happen before the data is stored locally. Defaults to None (load every column and row).
+            sample_rows (int, optional): Load a sample of this many rows of each table, rather than all of them.
+                Defaults to None (no sample).
+            sample_percent (float, optional): Load a sample of this percentage of the rows of each table, rather
+                than all of them. Defaults to None (no sample).
+            sample_method (str, optional): How sampled rows are chosen: "random" (a seeded reservoir or Bernoulli
+                sample) or "hash" (the rows with the lowest hashes of their contents, which picks the same rows in
+                every load of a file). Defaults to "random".
+            sample_seed (int, optional): Seed of the sample, so repeated loads take the same sample. Defaults to 42.
+            group_files (bool, optional): Whether to load sharded files (train-00000-of-00010.parquet, ...) and
+                hive-partitioned files (year=2024/...) as one table per group, read through DuckDB's multi-file
+                readers, rather than one table per file. Defaults to True.
+            datasets_cache (bool, optional): Whether to load the repo's splits from the local Arrow cache of the
+                datasets library when it holds a build of the repo at its current commit, with one table per
+                config and split, memory-mapping the cached Arrow files rather than downloading anything.  With
+                an in-memory database (no db_path) the tables are views over the mapped files, which are never
+                copied, so processes on the host share their pages (and compact_types does not apply); with a
+                db_path they are copied into the database. Falls back to the Hub if there is no such build.
+                Defaults to False.
+            datasets_cache_dir (str, optional): Directory of the datasets cache. Defaults to None (the
+                HF_DATASETS_CACHE environment variable, or ~/.cache/huggingface/datasets).
+            configs (List[str], optional): Names of the configs of the dataset card (its YAML configs section) to
+                load.  Only the files of their splits are loaded, one table per config and split, named
+                <config>_<split> (<split> for the "default" config).  Also selects the configs loaded from the
+                Parquet conversion and the datasets cache. Defaults to None (load every file).
+
+        Raises:
+            ValueError: If a table spec has a key other than "columns", "where" and "limit", parquet_cache is set
+                without cache_dir, or the sample options are invalid.
+        """
+        self.repo_id = repo_id
+        self.db_path = db_path
+        self.file_filters = file_filters
+        self.force_recreate = force_recreate
+        self.max_workers = max_workers
+        self.lazy = lazy
+        self.file_cache = FileCache(cache_dir, cache_max_bytes) if cache_dir else None
+        self.prepared_cache_size = prepared_cache_size
+        self._statement_ids = itertools.count()
+        self._prepared_generation = 0  # Bumped to invalidate every thread's prepared statements
+        self.threads = threads
+        # Thread ident -> that thread's cursor and prepared statements (see _thread_state)
+        self._cursors: Dict[int, Dict[str, Any]] = {}
+        self.async_max_concurrency = async_max_concurrency
+        self.column_stats = column_stats
+        self.histograms = histograms
+        self.histogram_bins = histogram_bins
+        self.parquet_cache = parquet_cache
+        self.parquet_row_group_size = parquet_row_group_size
+        self.parquet_branch = parquet_branch
+        self.schema_manifest = schema_manifest
+        self._manifest_lock = threading.Lock()  # Serializes new entries of the csv_schemas manifest
+        self.compact_types = compact_types
+        self.enum_max_values = enum_max_values
+        self.table_specs = table_specs or {}
+        for table_name, spec in self.table_specs.items():
+            unknown = set(spec) - {"columns", "where", "limit"}
+            if unknown:
+                raise ValueError(
+                    f"Unknown keys in the table spec of {table_name}: {', '.join(sorted(unknown))}"
+                )
+        if parquet_cache and not cache_dir:
+            raise ValueError("parquet_cache requires cache_dir")
+        if sample_rows is not None and sample_percent is not None:
+            raise ValueError("Specify at most one of sample_rows and sample_percent")
+        if sample_percent is not None and not 0 < sample_percent <= 100:
+            raise ValueError(f"sample_percent must be in (0, 100], not {sample_percent}")
+        if sample_method not in ("random", "hash"):
+            raise ValueError(f"sample_method must be 'random' or 'hash', not {sample_method!r}")
+        self.sample_rows = sample_rows
+        self.sample_percent = sample_percent
+        self.sample_method = sample_method
+        self.sample_seed = sample_seed
+        self.group_files = group_files
+        self.datasets_cache = datasets_cache
+        self.datasets_cache_dir = datasets_cache_dir
+        self.configs = [configs] if isinstance(configs, str) else configs
+        # Runs the async calls; its threads are only started by the first calls
+        self._async_executor = ThreadPoolExecutor(
+            max_workers=async_max_concurrency, thread_name_prefix="huggingduck-async"
+        )
+        self.result_cache = (
+            ResultCache(result_cache_bytes) if result_cache_bytes else None
+        )
+        self._data_version = 0  # Bumped whenever table contents may have changed
+        self._lock = threading.RLock()  # Serializes refreshes, which replace tables and the lazy table registry
+        self._registry_lock = threading.Lock()  # Guards the cursor registry and the per-table locks, held briefly
+        self._table_locks: Dict[str, threading.Lock] = {}  # Table name -> lock serializing its materialization
+        # Name -> memory-mapped Arrow table of each zero-copy view, registered on every cursor (see _map_arrow_table)
+        self._mapped_tables: Dict[str, pa.Table] = {}
+        self._mapped_generation = 0  # Bumped whenever a mapped table is added
+        # Unmaterialized table name -> file_name, file_size, blob_id, lfs_oid and revision of its repo file
+        self._lazy_tables: Dict[str, Dict[str, Any]] = {}
+        self.commit_sha: Optional[str] = None  # Repo commit the tables were loaded from
+        self.con = self._connect()  # Establish connection immediately
+
+    def _connect(self) -> duckdb.DuckDBPyConnection:
+        """
+        Establishes a DuckDB connection and sets up the schema, with optional persistence.
+
+        Returns:
+            duckdb.DuckDBPyConnection: A DuckDB connection instance.
+        """
+        try:
+            # Determine connection method
+            if self.db_path:
+                db_exists = os.path.exists(self.db_path)
+                con = duckdb.connect(database=self.db_path, read_only=False)
+                logger.info(f"Connected to DuckDB database file: {self.db_path}")
+            else:
+                db_exists = False  # In memory databases do not exist
+                con = duckdb.connect(database=":memory:", read_only=False)
+                logger.info("Connected to in-memory DuckDB database.")
+
+            if self.threads:
+                con.execute(f"SET threads = {int(self.threads)};")
+
+            self.schema_name = self.repo_id.replace("/", "_").replace(
+                "-", "_"
+            )  # Create a valid schema name
+
+            con.execute(f"CREATE SCHEMA IF NOT EXISTS {self.schema_name};")
+            con.execute(
+                f"SET search_path = '{self.schema_name}';"
+            )  # Set schema as the default
+
+            # Create metadata table (or add any newer columns to an existing one)
+            self._create_metadata_table(con)
+            for catalog, catalog_columns in CATALOG_TABLES.items():
+                columns = ",\n".join(
+                    f"{name} {sql_type}" for name, sql_type in catalog_columns.items()
+                )
+                con.execute(
+                    f"CREATE TABLE IF NOT EXISTS {self.schema_name}.{catalog} ({columns});"
+                )
+            columns = ",\n".join(
+                f"{name} {sql_type}" for name, sql_type in CSV_SCHEMAS_COLUMNS.items()
+            )
+            con.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.schema_name}.csv_schemas ({columns});"
+            )
+
+            # Check if we should recreate the database
+            if self.force_recreate or not db_exists:
+                # Load metadata and (optionally) data for all files in the repo
+                self._load_all_datasets(con)
+            else:
+                # Database exists, skip loading data
+                self.commit_sha = con.execute(
+                    f"SELECT max(commit_sha) FROM {self.schema_name}.metadata;"
+                ).fetchone()[0]
+                logger.info(
+                    f"Using existing database.  Skipping data load from Hugging Face. To force reload, set force_recreate=True"
+                )
+
+            self._lazy_tables = self._find_lazy_tables(con)
+
+            return con
+        except Exception as e:
+            logger.error(f"Connection error: {e}")
+            raise
+
+    def _create_metadata_table(self, con: duckdb.DuckDBPyConnection):
+        """Creates the metadata table, migrating the columns of one from an older database."""
+        columns = ",\n".join(
+            f"{name} {sql_type}" for name, sql_type in METADATA_COLUMNS.items()
+        )
+        con.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.schema_name}.metadata ({columns});"
+        )
+        existing = dict(
+            con.execute(
+                """
+                SELECT column_name, data_type FROM duckdb_columns()
+                WHERE schema_name = ? AND table_name = 'metadata';
+                """,
+                [self.schema_name],
+            ).fetchall()
+        )
+        for name, sql_type in METADATA_COLUMNS.items():
+            if name not in existing:
+                con.execute(
+                    f"ALTER TABLE {self.schema_name}.metadata ADD COLUMN {name} {sql_type};"
+                )
+            elif existing[name] == "INTEGER" and sql_type == "BIGINT":
+                con.execute(
+                    f"ALTER TABLE {self.schema_name}.metadata ALTER COLUMN {name} TYPE BIGINT;"
+                )
+                logger.info(f"Widened metadata column {name} to BIGINT")
+
+    def _load_all_datasets(
+        self,
+        con: duckdb.DuckDBPyConnection,
+        files: Optional[Dict[str, Dict[str, Any]]] = None,
+    ):
+        """Loads metadata and (optionally) data for all qualifying files in the Hugging Face repo.
+
+        With max_workers > 1 the files are loaded concurrently by a bounded pool of workers, each
+        using its own DuckDB cursor, so the wall-clock time is set by the slowest file rather than
+        the sum of all files.  The metadata records are collected as the files load and written from the
+        calling thread in one batch.
+
+        Args:
+            con (duckdb.DuckDBPyConnection): The connection to load into.
+            files (Dict[str, Dict[str, Any]], optional): The files to load, mapped to their Hub file info.
+                Defaults to None (all files in the repo that match file_filters).
+        """
+        if files is None:
+            self.commit_sha, files = self._fetch_repo_files()  # Get filtered files
+
+        if self.max_workers and self.max_workers > 1 and len(files) > 1:
+            with ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="huggingduck-load"
+            ) as executor:
+                futures = [
+                    executor.submit(self._load_dataset_on_cursor, con, file, file_info)
+                    for file, file_info in files.items()
+                ]
+                records = [future.result() for future in as_completed(futures)]
+        else:
+            records = [
+                self._load_dataset(con, file, file_info)
+                for file, file_info in files.items()
+            ]
+        for name, table in list(self._mapped_tables.items()):
+            con.register(name, table)  # Parallel loads only registered them on their own cursors
+        self._insert_metadata(con, records)
+
+    def _load_dataset_on_cursor(
+        self, con: duckdb.DuckDBPyConnection, file: str, file_info: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Loads a single file on a dedicated cursor of the connection (used by parallel ingest)."""
+        cursor = con.cursor()
+        try:
+            return self._load_dataset(cursor, file, file_info)
+        finally:
+            cursor.close()
+
+    def _load_dataset(
+        self, con: duckdb.DuckDBPyConnection, file: str, file_info: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Loads a single file from the Hugging Face repo into its own table.
+
+        Errors are logged rather than raised, so that one failing file does not affect the others.
+
+        Args:
+            con (duckdb.DuckDBPyConnection): The connection (or cursor) to load into.
+            file (str): The file name, relative to the repo root.
+            file_info (Dict[str, Any]): The Hub file info for the file, as returned by _fetch_repo_files.
+
+        Returns:
+            Dict[str, Any]: The metadata record for the file, keyed by metadata column name, along with
+                the rows of its table in each catalog (keyed by catalog table name).
+        """
+        record = {
+            "file_name": file,
+            "table_name": None,
+            "file_size": file_info.get("file_size"),
+            "file_type": "unknown",
+            "row_count": 0,
+            "is_loaded": False,
+            "commit_sha": self.commit_sha,
+            "blob_id": file_info.get("blob_id"),
+            "lfs_oid": file_info.get("lfs_oid"),
+            "revision": file_info.get("revision"),
+            **self._sample_metadata(),
+        }
+        start = time.perf_counter()
+        try:
+            file_path, bytes_downloaded = self._source_path(
+                file, file_info, download=not self.lazy
+            )
+            table_name = file_info.get("table_name") or self._table_name(file)
+
+            # Get file type
+            file_type = file_info.get("file_type") or file.split(".")[-1].lower()
+
+            if self.db_path is None and file_info.get("revision") == DATASETS_CACHE:
+                # Query the cached Arrow files in place, through a view over their memory maps
+                source = self._map_arrow_table(con, table_name, file_path)
+                con.execute(
+                    f"CREATE OR REPLACE VIEW {self.schema_name}.{table_name} AS {self._select_sql(table_name, source)}"
+                )
+                row_count = con.execute(
+                    f"SELECT count(*) FROM {self.schema_name}.{table_name}"
+                ).fetchone()[0]
+                record.update(self._compute_catalogs(con, table_name))
+                load_seconds = time.perf_counter() - start
+                logger.info(
+                    f"Mapped dataset as view: {self.schema_name}.{table_name} ({load_seconds:.2f}s)"
+                )
+                record.update(
+                    table_name=table_name,
+                    file_type=file_type,
+                    reader="arrow_ipc (memory-mapped view)",
+                    row_count=row_count,
+                    is_loaded=True,
+                    **_load_telemetry(record["file_size"], 0, load_seconds),
+                )
+                return record
+
+            if self.lazy and _file_format(file_path) not in _LOCAL_FORMATS:
+                # Register a view only; the data is read when the table is first queried.  Arrow IPC and zip
+                # files are always loaded, as a view cannot read them from a path.  CSV files are not sniffed
+                # until the table is materialized, so registering the view reads nothing.
+                source, reader = self._read_expression(
+                    con, file_path, file_info, sniff=False
+                )
+                con.execute(
+                    f"CREATE VIEW IF NOT EXISTS {self.schema_name}.{table_name} AS {self._select_sql(table_name, source)}"
+                )
+                logger.info(
+                    f"Registered lazy view: {self.schema_name}.{table_name}"
+                )
+                record.update(
+                    table_name=table_name,
+                    file_type=file_type,
+                    reader=reader,
+                    row_count=None,
+                    bytes_downloaded=bytes_downloaded,
+                    load_seconds=time.perf_counter() - start,
+                )
+                return record
+
+            # Create table for the data, and load the data set.  CREATE TABLE AS returns the number of
+            # rows inserted, so no second scan is needed for the count.
+            with self._reader(con, file, file_path, file_info) as (source, reader):
+                result = con.execute(
+                    f"CREATE TABLE IF NOT EXISTS {self.schema_name}.{table_name} AS {self._select_sql(table_name, source)}"
+                ).fetchone()
+            if result is None:  # The table already existed, so nothing was loaded
+                result = con.execute(
+                    f"SELECT count(*) FROM {self.schema_name}.{table_name}"
+                ).fetchone()
+            row_count = result[0]
+            if self.compact_types:
+                record["original_types"] = self._compact_table(con, table_name)
+            record.update(self._compute_catalogs(con, table_name))
+
+            if file_path.startswith("hf://"):
+                bytes_downloaded = record["file_size"] or 0  # Read straight from the Hub
+
+            load_seconds = time.perf_counter() - start
+            logger.info(
+                f"Loaded dataset into table: {self.schema_name}.{table_name} ({load_seconds:.2f}s)"
+            )
+            record.update(
+                table_name=table_name,
+                file_type=file_type,
+                reader=reader,
+                row_count=row_count,
+                is_loaded=True,
+                **_load_telemetry(record["file_size"], bytes_downloaded, load_seconds),
+            )
+            return record
+
+        except Exception as e:
+            logger.error(f"Error loading dataset {file}: {e}")
+            record["load_seconds"] = time.perf_counter() - start
+            return record
+
+    def refresh(self) -> Dict[str, List[str]]:
+        """Brings the tables up to date with the Hugging Face repo, reloading only what has changed.
+
+        The repo's current commit and each file's blob id and LFS oid are compared with the values
+        recorded in the metadata table.  Files that were added, changed, or previously failed to load
+        are (re)loaded, and tables for deleted files are dropped; all other tables are left untouched.
+
+        Returns:
+            Dict[str, List[str]]: The "added", "changed" and "deleted" file names.
+        """
+        with self._lock:
+            changes = {"added": [], "changed": [], "deleted": []}
+            commit_sha, files = self._fetch_repo_files()
+            if commit_sha is None:
+                logger.warning("Could not fetch repo info.  Skipping refresh.")
+                return changes
+
+            known = {
+                file_name: (table_name, row_commit_sha, blob_id, lfs_oid, is_loaded)
+                for file_name, table_name, row_commit_sha, blob_id, lfs_oid, is_loaded in self.con.execute(
+                    f"SELECT file_name, table_name, commit_sha, blob_id, lfs_oid, is_loaded FROM {self.schema_name}.metadata;"
+                ).fetchall()
+            }
+            # Files that failed to load have no table, and are retried even when the commit is unchanged
+            if known and all(
+                row[1] == commit_sha and row[0] is not None for row in known.values()
+            ):
+                logger.info(f"Already up to date with commit {commit_sha}.")
+                return changes
+
+            for file, file_info in files.items():
+                if file not in known:
+                    changes["added"].append(file)
+                else:
+                    table_name, _, blob_id, lfs_oid, _ = known[file]
+                    if table_name is None or (blob_id, lfs_oid) != (
+                        file_info["blob_id"],
+                        file_info["lfs_oid"],
+                    ):
+                        changes["changed"].append(file)
+            changes["deleted"] = [file for file in known if file not in files]
+
+            # Drop the stale tables and their metadata, then load the new versions
+            for file in changes["changed"] + changes["deleted"]:
+                table_name, _, _, _, is_loaded = known[file]
+                if table_name is None and is_loaded:
+                    table_name = self._table_name(file)  # Loaded before table names were recorded
+                if table_name is not None:
+                    with self._table_lock(table_name):  # Waits for a materialization in flight
+                        self._drop_table(self.con, table_name)
+                    for catalog in CATALOG_TABLES:
+                        self.con.execute(
+                            f"DELETE FROM {self.schema_name}.{catalog} WHERE table_name = ?;",
+                            [table_name],
+                        )
+                self.con.execute(
+                    f"DELETE FROM {self.schema_name}.metadata WHERE file_name = ?;",
+                    [file],
+                )
+            self.commit_sha = commit_sha
+            self._load_all_datasets(
+                self.con,
+                {file: files[file] for file in changes["added"] + changes["changed"]},
+            )
+            self.con.execute(
+                f"UPDATE {self.schema_name}.metadata SET commit_sha = ?;", [commit_sha]
+            )
+            self._lazy_tables = self._find_lazy_tables(self.con)
+            self._clear_prepared()  # Statements may refer to replaced tables
+            if any(changes.values()):
+                self._invalidate_results()
+
+            logger.info(
+                f"Refreshed to commit {commit_sha}: {len(changes['added'])} added, "
+                f"{len(changes['changed'])} changed, {len(changes['deleted'])} deleted."
+            )
+            return changes
+
+    def _fetch_repo_files(self) -> Tuple[Optional[str], Dict[str, Dict[str, Any]]]:
+        """Fetches the repo's current commit and the Hub file info of every file matching file_filters.
+
+        With datasets_cache, the config/splits of a build of the repo in the local datasets cache are returned
+        instead when there is one at the current commit, and with parquet_branch, the config/split groups of the
+        Hub's Parquet conversion when the conversion exists.  With configs, the files of those configs of the
+        dataset card are returned, as one logical file per config and split (see _config_files).  With
+        group_files, sharded and partitioned files are grouped (see _group_files).
+
+        Returns:
+            Tuple[Optional[str], Dict[str, Dict[str, Any]]]: The commit SHA (None on error), and a mapping
+                of file name to its "file_size", "blob_id" and "lfs_oid".
+        """
+        if self.datasets_cache:
+            commit_sha, splits = self._fetch_datasets_cache_files()
+            if splits:
+                return commit_sha, splits
+            logger.info("No build of the repo found in the datasets cache.  Loading from the Hub.")
+        if self.parquet_branch:
+            commit_sha, groups = self._fetch_parquet_branch_files()
+            if groups:
+                return commit_sha, groups
+            logger.info("No Parquet conversion of the repo found.  Loading the raw files.")
+        try:
+            api = HfApi()
+            info = api.dataset_info(self.repo_id, files_metadata=True)
+            siblings = {sibling.rfilename: sibling for sibling in info.siblings or []}
+            files = {
+                file: {
+                    "file_size": siblings[file].size,
+                    "blob_id": siblings[file].blob_id,
+                    "lfs_oid": siblings[file].lfs.sha256 if siblings[file].lfs else None,
+                }
+                for file in _filter_files(list(siblings), self.file_filters)
+            }
+            if self.configs:
+                return info.sha, self._config_files(files, info.card_data)
+            return info.sha, self._group_files(files) if self.group_files else files
+        except Exception as e:
+            logger.error(f"An error occurred: {e}")
+            return None, {}
+
+    def _fetch_datasets_cache_files(
+        self,
+    ) -> Tuple[Optional[str], Dict[str, Dict[str, Any]]]:
+        """Finds the Arrow files of the repo's splits in the local cache of the datasets library.
+
+        The datasets library caches each build of a repo as <cache>/<namespace>___<name>/<config>/<version>/<hash>/,
+        holding a dataset_info.json and one Arrow file (or several shards) per split.  A build is used only if it
+        was downloaded at the repo's current commit, which is read from the URLs of its download checksums; when
+        the Hub cannot be reached, the newest build of each config is used.  Each split becomes one table, named
+        <split> for the "default" config and <config>_<split> otherwise.
+
+        Returns:
+            Tuple[Optional[str], Dict[str, Dict[str, Any]]]: The commit SHA of the builds, and a mapping of the
+                local path of each split's Arrow file (a glob for shards) to its total "file_size", "blob_id",
+                "lfs_oid" (None), "table_name", "file_type" and "revision".  None and an empty dict if there is no
+                usable build.
+        """
+        cache_dir = Path(
+            self.datasets_cache_dir
+            or os.environ.get("HF_DATASETS_CACHE", DATASETS_CACHE_DIR)
+        ).expanduser()
+        repo_dir = cache_dir / self.repo_id.replace("/", "___")
+        if not repo_dir.is_dir():
+            return None, {}
+        try:
+            commit_sha = HfApi().dataset_info(self.repo_id).sha
+        except Exception as e:
+            logger.info(f"Could not fetch the repo's commit, using the newest cached builds: {e}")
+            commit_sha = None
+
+        builds = []
+        for info_path in repo_dir.glob("*/*/*/dataset_info.json"):
+            if info_path.parent.name.endswith(".incomplete"):
+                continue  # Still being written by datasets
+            try:
+                info = json.loads(info_path.read_text())
+            except (OSError, ValueError) as e:
+                logger.debug(f"Could not read {info_path}: {e}")
+                continue
+            commits = {
+                match.group(1)
+                for url in info.get("download_checksums") or {}
+                for match in [_CACHED_COMMIT.search(url)]
+                if match
+            }
+            if commit_sha is None or commit_sha in commits:
+                builds.append((info_path.stat().st_mtime, info_path.parent, info, commits))
+
+        files: Dict[str, Dict[str, Any]] = {}
+        build_commit = None
+        for _, build_dir, info, commits in sorted(
+            builds, key=lambda build: build[0], reverse=True
+        ):
+            config = info.get("config_name") or build_dir.parents[1].name
+            if self.configs and config not in self.configs:
+                continue
+            prefix = info.get("dataset_name") or info.get("builder_name")
+            for split in info.get("splits") or {}:
+                table_name = re.sub(
+                    r"\W", "_", split if config == "default" else f"{config}_{split}"
+                )
+                if any(found["table_name"] == table_name for found in files.values()):
+                    continue  # Already found in a newer build
+                path = build_dir / f"{prefix}-{split}.arrow"
+                shards = (
+                    [path]
+                    if path.exists()
+                    else sorted(build_dir.glob(f"{prefix}-{split}-?????-of-*.arrow"))
+                )
+                if not shards:
+                    continue
+                if len(shards) > 1:
+                    path = build_dir / f"{prefix}-{split}-?????-of-*.arrow"
+                shard_info = {
+                    str(shard): {
+                        "file_size": shard.stat().st_size,
+                        "blob_id": f"{shard.stat().st_size}:{shard.stat().st_mtime_ns}",
+                        "lfs_oid": None,
+                    }
+                    for shard in shards
+                }
+                files[str(path)] = _group_file_info(
+                    shard_info,
+                    list(shard_info),
+                    table_name=table_name,
+                    file_type="arrow",
+                    revision=DATASETS_CACHE,
+                )
+                build_commit = build_commit or max(commits, default=None)
+        if files:
+            logger.info(f"Found {len(files)} splits of the repo in the datasets cache: {repo_dir}")
+        return commit_sha or build_commit, files
+
+    def _fetch_parquet_branch_files(
+        self,
+    ) -> Tuple[Optional[str], Dict[str, Dict[str, Any]]]:
+        """Fetches the commit of the repo's Parquet conversion and its shards, grouped by config and split.
+
+        Returns:
+            Tuple[Optional[str], Dict[str, Dict[str, Any]]]: The commit SHA of the Parquet branch, and a mapping
+                of "<config>/<split>" to the Hub file info of its shards, combined (see _group_parquet_shards).
+                None and an empty dict if the repo has no Parquet conversion.
+        """
+        try:
+            api = HfApi()
+            info = api.dataset_info(
+                self.repo_id, revision=PARQUET_BRANCH, files_metadata=True
+            )
+        except Exception as e:
+            logger.debug(f"Could not fetch the Parquet conversion: {e}")
+            return None, {}
+        groups = self._group_parquet_shards(
+            {
+                sibling.rfilename: {
+                    "file_size": sibling.size,
+                    "blob_id": sibling.blob_id,
+                    "lfs_oid": sibling.lfs.sha256 if sibling.lfs else None,
+                }
+                for sibling in info.siblings or []
+            }
+        )
+        if self.configs:
+            groups = {
+                group: group_info
+                for group, group_info in groups.items()
+                if group.split("/")[0] in self.configs
+            }
+        return info.sha, groups
+
+    @staticmethod
+    def _group_parquet_shards(
+        files: Dict[str, Dict[str, Any]],
+    ) -> Dict[str, Dict[str, Any]]:
+        """Groups the shards of a Parquet conversion into one logical file per config and split.
+
+        Shards are laid out as <config>/<split>/<shard>.parquet.  Each group becomes one table, named
+        <split> for the "default" config and <config>_<split> otherwise.
+
+        Args:
+            files (Dict[str, Dict[str, Any]]): The Hub file info of each file of the Parquet branch.
+
+        Returns:
+            Dict[str, Dict[str, Any]]: A mapping of "<config>/<split>" to its total "file_size", "blob_id",
+                "lfs_oid" (None), "table_name", "file_type" and "revision".
+        """
+        shards: Dict[str, List[str]] = {}
+        for file in sorted(files):
+            parts = file.split("/")
+            if len(parts) == 3 and file.endswith(".parquet"):
+                shards.setdefault(f"{parts[0]}/{parts[1]}", []).append(file)
+
+        groups = {}
+        for group, group_files in shards.items():
+            config, split = group.split("/")
+            table_name = split if config == "default" else f"{config}_{split}"
+            groups[group] = _group_file_info(
+                files,
+                group_files,
+                table_name=re.sub(r"\W", "_", table_name),
+                file_type="parquet",
+                revision=PARQUET_BRANCH,
+            )
+        return groups
+
+    def _config_files(
+        self, files: Dict[str, Dict[str, Any]], card_data: Any
+    ) -> Dict[str, Dict[str, Any]]:
+        """Selects the repo files of the requested configs of the dataset card, one logical file per config and split.
+
+        Each split's data_files patterns are matched against the repo files.  A split matching a single file is
+        loaded from that file; one matching several files is read through DuckDB's multi-file readers, as a glob
+        if the split has a single pattern (the pattern itself, or every file of the same type below a directory
+        pattern), and otherwise as the list of matched files (named after them, joined by " + ").  Configs missing
+        from the card are reported and skipped, as are splits matching no files and files already loaded for
+        another config.
+
+        Args:
+            files (Dict[str, Dict[str, Any]]): The Hub file info of each repo file.
+            card_data (Any): The repo's dataset card data (the card_data of its dataset info), or None.
+
+        Returns:
+            Dict[str, Dict[str, Any]]: A mapping of file name or split glob to its Hub file info, with a
+                "table_name" and "file_type" (combined for globs, see _group_file_info).
+        """
+        card_configs = {
+            config["config_name"]: config.get("data_files")
+            for config in (card_data.to_dict() if card_data else {}).get("configs") or []
+            if "config_name" in config
+        }
+        missing = [config for config in self.configs if config not in card_configs]
+        if missing:
+            logger.error(
+                f"Configs not in the dataset card: {', '.join(missing)} "
+                f"(available: {', '.join(card_configs) or 'none'})"
+            )
+
+        selected: Dict[str, Dict[str, Any]] = {}
+        for config in self.configs:
+            for split, patterns in _card_data_files(card_configs.get(config)).items():
+                table_name = re.sub(
+                    r"\W", "_", split if config == "default" else f"{config}_{split}"
+                )
+                matched = sorted(
+                    file
+                    for file in files
+                    if any(_matches_pattern(file, pattern) for pattern in patterns)
+                )
+                if not matched:
+                    logger.warning(f"No files match split {split} of config {config}: {patterns}")
+                    continue
+                file_type = matched[0].split(".")[-1].lower()
+                if len(matched) == 1:
+                    name, info = matched[0], dict(files[matched[0]])
+                elif len(patterns) == 1:
+                    pattern = patterns[0].removeprefix("./")
+                    if "*" not in pattern:
+                        pattern = f"{pattern.rstrip('/')}/**/*.{file_type}"
+                    name, info = pattern, _group_file_info(files, matched)
+                else:
+                    formats = {_file_format(file) for file in matched}
+                    if len(formats) != 1 or formats & {None, *_LOCAL_FORMATS}:
+                        logger.warning(
+                            f"Split {split} of config {config} matches files that cannot be read together: "
+                            f"{', '.join(matched)}"
+                        )
+                        continue
+                    name, info = _FILE_LIST_SEPARATOR.join(matched), _group_file_info(files, matched)
+                if name in selected:
+                    logger.warning(
+                        f"{name} is already loaded as {selected[name]['table_name']}, not as {table_name}"
+                    )
+                    continue
+                selected[name] = {**info, "table_name": table_name, "file_type": file_type}
+        return selected
+
+    def _group_files(
+        self, files: Dict[str, Dict[str, Any]]
+    ) -> Dict[str, Dict[str, Any]]:
+        """Groups sharded and hive-partitioned repo files into logical files, each loaded as one table.
+
+        Shards such as data/train-00000-of-00010.parquet are grouped by name and shard count, into
+        data/train-?????-of-00010*.parquet (table "train").  Files below key=value directories are grouped by the
+        directory above the partitions and the partition keys, e.g. sales/year=2024/part-0.parquet into
+        sales/year=*/*.parquet (table "sales"), a glob that only matches files at the partitions' depth.  Each
+        group is read through DuckDB's multi-file readers, as a glob, with hive partitioning enabled (so Arrow IPC
+        and zip files, which DuckDB does not read itself, are never grouped).  Other files keep their own tables,
+        named after the file's path rather than its base name if the base name is not unique.
+
+        Args:
+            files (Dict[str, Dict[str, Any]]): The Hub file info of each repo file.
+
+        Returns:
+            Dict[str, Dict[str, Any]]: A mapping of file name or group glob to its Hub file info, where groups
+                have combined file info (see _group_file_info) with a "table_name" and "file_type".
+        """
+        groups: Dict[str, List[str]] = {}
+        table_names: Dict[str, str] = {}  # File name or group glob -> table name
+        paths: Dict[str, str] = {}  # File name or group glob -> path it is named after if its name collides
+        for file in sorted(files):
+            directory, base = os.path.split(file)
+            parts = file.split("/")
+            partition = next(
+                (index for index, part in enumerate(parts[:-1]) if "=" in part), None
+            )
+            shard = _SHARD_FILE.match(base)
+            if _file_format(file) in _LOCAL_FORMATS:
+                partition = shard = None  # Not read by DuckDB's multi-file readers, so never grouped
+            if partition is not None:
+                root = "/".join(parts[:partition])
+                suffix = "".join(Path(file).suffixes)
+                directories = [
+                    f"{part.split('=')[0]}=*" if "=" in part else "*"
+                    for part in parts[partition:-1]
+                ]
+                name = "/".join([*parts[:partition], *directories, f"*{suffix}"])
+                table_names[name] = os.path.basename(root) or self.repo_id.split("/")[-1]
+                paths[name] = root or table_names[name]
+            elif shard is not None:
+                name = os.path.join(
+                    directory, f"{shard['name']}-?????-of-{shard['count']}*{shard['ext']}"
+                )
+                table_names[name] = shard["name"]
+                paths[name] = os.path.join(directory, shard["name"])
+            else:
+                table_names[file] = self._table_name(file)
+                paths[file] = os.path.splitext(file)[0]
+                continue
+            groups.setdefault(name, []).append(file)
+
+        # Tables whose names collide are named after their path instead, then also their file type
+        for rename in (
+            lambda name: paths[name],
+            lambda name: f"{paths[name]}_{name.split('.')[-1]}",
+        ):
+            counts: Dict[str, int] = {}
+            for table_name in table_names.values():
+                counts[table_name] = counts.get(table_name, 0) + 1
+            for name, table_name in table_names.items():
+                if counts[table_name] > 1:
+                    table_names[name] = rename(name)
+        for name, table_name in table_names.items():
+            if name in groups or table_name != self._table_name(name):
+                table_names[name] = re.sub(r"\W", "_", table_name)
+
+        grouped = {}
+        for name, table_name in table_names.items():
+            if name in groups:
+                grouped[name] = _group_file_info(
+                    files,
+                    groups[name],
+                    table_name=table_name,
+                    file_type=name.split(".")[-1].lower(),
+                )
+            elif table_name != self._table_name(name):
+                grouped[name] = {**files[name], "table_name": table_name}
+            else:
+                grouped[name] = files[name]
+        return grouped
+
+    def _map_arrow_table(
+        self, con: duckdb.DuckDBPyConnection, table_name: str, file_path: str
+    ) -> str:
+        """Memory-maps a table's Arrow files and registers them, returning the name they are registered under.
+
+        Registrations only exist on the connection (or cursor) they were made on, so the mapped table is kept and
+        registered on every thread's cursor as well (see _thread_state).
+        """
+        name = f"huggingduck_mapped_{table_name}"
+        table = _read_arrow_files(file_path)
+        with self._registry_lock:
+            self._mapped_tables[name] = table
+            self._mapped_generation += 1
+        con.register(name, table)
+        return name
+
+    def _drop_table(self, con: duckdb.DuckDBPyConnection, table_name: str):
+        """Drops a loaded table, or the view of a table that has not been materialized (or is memory-mapped)."""
+        mapped_name = f"huggingduck_mapped_{table_name}"
+        if mapped_name in self._mapped_tables:
+            con.execute(f"DROP VIEW IF EXISTS {self.schema_name}.{table_name};")
+            with self._registry_lock:
+                del self._mapped_tables[mapped_name]
+        elif table_name in self._lazy_tables:
+            con.execute(f"DROP VIEW IF EXISTS {self.schema_name}.{table_name};")
+            self._lazy_tables.pop(table_name, None)
+        else:
+            con.execute(f"DROP TABLE IF EXISTS {self.schema_name}.{table_name};")
+
+    def _find_lazy_tables(
+        self, con: duckdb.DuckDBPyConnection
+    ) -> Dict[str, Dict[str, Any]]:
+        """Returns the tables that are still registered as views over their hf:// paths.
+
+        Returns:
+            Dict[str, Dict[str, Any]]: A mapping of table name to the file_name, file_size, blob_id, lfs_oid
+                and revision of its repo file, for each unmaterialized table.
+        """
+        rows = con.execute(
+            f"""
+            SELECT m.table_name, m.file_name, m.file_size, m.blob_id, m.lfs_oid, m.revision
+            FROM {self.schema_name}.metadata m
+            JOIN duckdb_views() v
+              ON v.schema_name = ? AND v.view_name = m.table_name
+            WHERE NOT m.is_loaded;
+            """,
+            [self.schema_name],
+        ).fetchall()
+        return {
+            table_name: {
+                "file_name": file_name,
+                "file_size": file_size,
+                "blob_id": blob_id,
+                "lfs_oid": lfs_oid,
+                "revision": revision,
+            }
+            for table_name, file_name, file_size, blob_id, lfs_oid, revision in rows
+        }
+
+    def materialize(self, table_name: str):
+        """Replaces a lazily registered view with a local table holding its data.
+
+        Does nothing if the table is not (or no longer) lazy.  Each table is materialized on its own cursor
+        under its own lock, so queries of other tables (and materializations of them) do not wait for it.
+
+        Args:
+            table_name (str): The name of the table to materialize.
+        """
+        if table_name not in self._lazy_tables:
+            return
+        with self._table_lock(table_name):
+            file_info = self._lazy_tables.get(table_name)
+            if file_info is None:
+                return  # Materialized by another thread while this one waited
+
+            start = time.perf_counter()
+            file_path, bytes_downloaded = self._source_path(
+                file_info["file_name"], file_info
+            )
+            if file_path.startswith("hf://"):
+                bytes_downloaded = file_info["file_size"] or 0  # Read straight from the Hub
+            con = self.con.cursor()  # Its own cursor, so tables can be materialized in parallel
+            try:
+                # Swap the view for a table in one transaction, so a failed download leaves the view in place
+                con.execute("BEGIN TRANSACTION;")
+                con.execute(f"DROP VIEW {self.schema_name}.{table_name};")
+                with self._reader(
+                    con, file_info["file_name"], file_path, file_info
+                ) as (source, reader):
+                    row_count = con.execute(
+                        f"CREATE TABLE {self.schema_name}.{table_name} AS {self._select_sql(table_name, source)}"
+                    ).fetchone()[0]  # CREATE TABLE AS returns the number of rows inserted
+                updates = {"row_count": row_count, "reader": reader}
+                if self.compact_types:
+                    updates["original_types"] = self._compact_table(con, table_name)
+                load_seconds = time.perf_counter() - start
+                updates.update(
+                    _load_telemetry(file_info["file_size"], bytes_downloaded, load_seconds)
+                )
+                assignments = ", ".join(f"{column} = ?" for column in updates)
+                con.execute(
+                    f"""
+                    UPDATE {self.schema_name}.metadata
+                    SET is_loaded = TRUE, {assignments}
+                    WHERE table_name = ?;
+                    """,
+                    [*updates.values(), table_name],
+                )
+                for catalog, rows in self._compute_catalogs(con, table_name).items():
+                    self._replace_catalog_rows(con, catalog, rows)
+                con.execute("COMMIT;")
+            except Exception as e:
+                con.execute("ROLLBACK;")
+                logger.error(f"Error materializing table {table_name}: {e}")
+                raise
+            finally:
+                con.close()
+
+            self._lazy_tables.pop(table_name, None)
+            self._clear_prepared()  # Statements may refer to the dropped view
+            self._invalidate_results()  # Cached results of metadata and the catalogs are stale
+            logger.info(
+                f"Materialized lazy table: {self.schema_name}.{table_name} ({load_seconds:.2f}s)"
+            )
+
+    def _materialize_referenced(self, sql: str):
+        """Materializes any lazy tables referenced by a SQL statement before it runs."""
+        if not self._lazy_tables:
+            return
+        # Match on identifiers rather than binding the statement, since binding expands the views
+        # (the worst case is materializing a table whose name also appears as a column)
+        identifiers = set(re.findall(r"[A-Za-z_][A-Za-z0-9_]*", sql))
+        for table_name in identifiers.intersection(list(self._lazy_tables)):
+            self.materialize(table_name)
+
+    def _table_lock(self, table_name: str) -> threading.Lock:
+        """Returns the lock serializing the materialization of a table, creating it on first use."""
+        with self._registry_lock:
+            return self._table_locks.setdefault(table_name, threading.Lock())
+
+    def _table_name(self, file: str) -> str:
+        """Derives the table name for a repo file from its base name, without its format and compression extensions."""
+        name = os.path.basename(file)
+        if Path(name).suffix.lower() in _COMPRESSION_SUFFIXES:
+            name = os.path.splitext(name)[0]
+        return os.path.splitext(name)[0]
+
+    def _source_path(
+        self,
+        file: str,
+        file_info: Optional[Dict[str, Any]] = None,
+        download: bool = True,
+    ) -> Tuple[str, int]:
+        """Returns the path DuckDB reads a repo file from.
+
+        With a file cache, this is the locally cached copy of the file, downloaded first on a cache miss.  With
+        parquet_cache, CSV files are cached as Parquet instead, converted right after they are downloaded.
+
+        Args:
+            file (str): The file name, relative to the repo root.
+            file_info (Dict[str, Any], optional): The Hub file info for the file. Defaults to None (not cacheable).
+            download (bool, optional): Whether to download the file into the cache on a miss, rather than
+                falling back to its hf:// path. Defaults to True.
+
+        Returns:
+            Tuple[str, int]: A local path or an hf:// path, and the number of bytes downloaded into the cache.
+        """
+        if (file_info or {}).get("revision") == PARQUET_BRANCH:
+            # A config/split of the Parquet conversion, read straight from its shards
+            return f"hf://datasets/{self.repo_id}@~parquet/{file}/*.parquet", 0
+        if (file_info or {}).get("revision") == DATASETS_CACHE:
+            return file, 0  # A split's Arrow files in the local datasets cache
+
+        key = (file_info or {}).get("lfs_oid") or (file_info or {}).get("blob_id")
+        if _FILE_LIST_SEPARATOR in file:
+            return file, 0  # A list of files, each read from its hf:// path (see _read_expression)
+        if self.file_cache is None or key is None or "*" in file:
+            return self._remote_path(file), 0  # Groups of files are read in place, keeping their layout
+
+        suffix = "".join(Path(file).suffixes)  # Keep the extension for DuckDB's reader detection
+        convert = self.parquet_cache and _file_format(file) == "csv"
+        if convert:
+            suffix = ".parquet"
+        if not download:
+            if self.file_cache.contains(key, suffix):
+                return self.file_cache.path(key, suffix), 0
+            return self._remote_path(file), 0
+
+        cached_path = self.file_cache.get(key, suffix)
+        if cached_path is not None:
+            return cached_path, 0
+
+        download_dir = tempfile.mkdtemp(
+            prefix=".download-", dir=self.file_cache.cache_dir
+        )  # Same filesystem as the cache, so the file can be moved into it
+        try:
+            local_path = self._download_file(file, download_dir)
+            bytes_downloaded = os.path.getsize(local_path)
+            if convert:
+                local_path = self._convert_to_parquet(local_path, download_dir)
+            logger.info(f"Downloaded {file} into the file cache")
+            return self.file_cache.put(key, local_path, suffix), bytes_downloaded
+        finally:
+            shutil.rmtree(download_dir, ignore_errors=True)
+
+    def _convert_to_parquet(self, csv_path: str, output_dir: str) -> str:
+        """Converts a downloaded CSV file to zstd-compressed Parquet in the given directory and returns its path."""
+        start = time.perf_counter()
+        parquet_path = os.path.join(output_dir, "converted.parquet")
+        with duckdb.connect() as con:  # Separate from the database, so conversions can run in any thread
+            con.execute(
+                f"""
+                COPY (SELECT * FROM '{csv_path}') TO '{parquet_path}'
+                (FORMAT parquet, COMPRESSION zstd, ROW_GROUP_SIZE {int(self.parquet_row_group_size)});
+                """
+            )
+        logger.info(
+            f"Converted {os.path.basename(csv_path)} to Parquet: {os.path.getsize(csv_path)} -> "
+            f"{os.path.getsize(parquet_path)} bytes ({time.perf_counter() - start:.2f}s)"
+        )
+        return parquet_path
+
+    @contextlib.contextmanager
+    def _reader(
+        self,
+        con: duckdb.DuckDBPyConnection,
+        file: str,
+        file_path: str,
+        file_info: Optional[Dict[str, Any]] = None,
+    ) -> Iterator[Tuple[str, str]]:
+        """Provides the table expression a load reads a file with, dispatching on the file's format.
+
+        Formats DuckDB reads from a path get their reader from _read_expression.  Arrow IPC files (or a glob of
+        shards) are memory-mapped with pyarrow and registered on the connection, so DuckDB scans their buffers
+        without copying them, and the data members of a zip archive are extracted (streaming each one to disk) and
+        read with the reader of their own format.  Both are read from a local copy, downloaded first if the file is
+        remote, which is deleted (and the registration dropped) once the load is done.
+
+        Args:
+            con (duckdb.DuckDBPyConnection): The connection (or cursor) that runs the load.
+            file (str): The file name, relative to the repo root.
+            file_path (str): The path of the file, as returned by _source_path.
+            file_info (Dict[str, Any], optional): The Hub file info for the file. Defaults to None.
+
+        Yields:
+            Tuple[str, str]: The table expression for the FROM clause, and the name of the reader.
+        """
+        file_format = _file_format(file_path)
+        if file_format not in _LOCAL_FORMATS:
+            yield self._read_expression(con, file_path, file_info)
+            return
+
+        with tempfile.TemporaryDirectory(prefix="huggingduck-") as work_dir:
+            if "*" not in file_path and not os.path.exists(file_path):  # Remote, so download a local copy
+                file_path = self._download_file(file, work_dir)
+
+            if file_format == "arrow":
+                view_name = f"huggingduck_arrow_{threading.get_ident()}"
+                con.register(view_name, _read_arrow_files(file_path))
+                try:
+                    yield view_name, "arrow_ipc (memory-mapped)"
+                finally:
+                    con.unregister(view_name)
+                return
+
+            members_dir = os.path.join(work_dir, "members")
+            with zipfile.ZipFile(file_path) as archive:
+                members = [
+                    member
+                    for member in archive.infolist()
+                    if not member.is_dir()
+                    and not member.filename.startswith("__MACOSX/")
+                    and _file_format(member.filename) not in (None, "zip")
+                ]
+                formats = {_file_format(member.filename) for member in members}
+                if len(formats) != 1:
+                    raise ValueError(
+                        f"Expected data files of a single format in {file}, found: "
+                        f"{', '.join(sorted(formats)) or 'none'}"
+                    )
+                for member in members:
+                    archive.extract(member, members_dir)
+            if len(members) == 1:
+                member_path = os.path.join(members_dir, members[0].filename)
+            else:
+                member_path = os.path.join(
+                    members_dir, "**", f"*{Path(members[0].filename).suffix}"
+                )
+            with self._reader(con, file, member_path) as (source, reader):
+                yield source, f"zip: {reader}"
+
+    def _read_expression(
+        self,
+        con: duckdb.DuckDBPyConnection,
+        file_path: str,
+        file_info: Optional[Dict[str, Any]] = None,
+        sniff: bool = True,
+    ) -> Tuple[str, str]:
+        """Returns the table expression DuckDB reads a file with, for the FROM clause of a load.
+
+        Each format gets its own reader.  CSV files are read by DuckDB's parallel CSV reader, and newline-delimited
+        JSON with format = 'newline_delimited', which lets DuckDB split the file between threads; both decompress
+        .gz and .zst files while streaming them.  A group of files (a glob path) is read with the multi-file reader
+        of its format, with hive partitioning, so predicates on partition columns skip whole partitions, as is a
+        list of files (their names joined by " + ").  With schema_manifest, a CSV file is read with the dialect and
+        column types recorded for its hash, sniffing them (and recording them) only the first time the file is
+        seen.  Files of unknown formats are read by path, letting DuckDB pick the reader.
+
+        Args:
+            con (duckdb.DuckDBPyConnection): The connection (or cursor) to query the manifest with.
+            file_path (str): The path of the file, as returned by _source_path.
+            file_info (Dict[str, Any], optional): The Hub file info for the file. Defaults to None (no hash).
+            sniff (bool, optional): Whether to sniff a CSV file missing from the manifest, which reads the start
+                of the file.  If False, such a file is read with auto-detection instead. Defaults to True.
+
+        Returns:
+            Tuple[str, str]: The table expression (a reader call, or a quoted path), and the name of the reader.
+        """
+        files = file_path.split(_FILE_LIST_SEPARATOR)
+        file_format = _file_format(files[0])
+        if len(files) > 1:
+            target = f"[{', '.join(f"'{self._remote_path(file)}'" for file in files)}]"
+        else:
+            target = f"'{file_path}'"
+        options = [_MULTI_FILE_OPTIONS] if "*" in file_path or len(files) > 1 else []
+        if file_format == "parquet":
+            return f"read_parquet({', '.join([target, *options])})", "read_parquet"
+        if file_format in ("json", "jsonl"):
+            if file_format == "jsonl":
+                options.append("format = 'newline_delimited'")
+            reader = "read_json" + (" (newline_delimited)" if file_format == "jsonl" else "")
+            return f"read_json({', '.join([target, *options])})", reader
+        if file_format != "csv":
+            return target, "auto"
+
+        key = (file_info or {}).get("lfs_oid") or (file_info or {}).get("blob_id")
+        if not self.schema_manifest or key is None or options:
+            return f"read_csv({', '.join([target, *options])})", "read_csv"
+
+        manifest = f"{self.schema_name}.csv_schemas"
+        query = f"SELECT * FROM {manifest} WHERE file_hash = ? LIMIT 1;"
+        schema = con.execute(query, [key]).fetchone()
+        if schema is None and not sniff:
+            return f"read_csv({target})", "read_csv"
+        if schema is None:
+            sniffed = con.execute(
+                f"""
+                SELECT Delimiter, Quote, Escape, NewLineDelimiter, SkipRows, HasHeader, Columns,
+                    DateFormat, TimestampFormat
+                FROM sniff_csv('{file_path}');
+                """
+            ).fetchone()
+            sniffed = [
+                "" if value in _CSV_EMPTY_OPTIONS else value for value in sniffed
+            ]
+            with self._manifest_lock:  # Files with the same content may be loading in parallel
+                con.execute(
+                    f"""
+                    INSERT INTO {manifest}
+                    SELECT ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, now()::TIMESTAMP
+                    WHERE NOT EXISTS (SELECT 1 FROM {manifest} WHERE file_hash = ?);
+                    """,
+                    [key, *sniffed, key],
+                )
+            schema = con.execute(query, [key]).fetchone()
+            logger.debug(f"Recorded the CSV schema of {file_path}")
+        schema = dict(zip(CSV_SCHEMAS_COLUMNS, schema))
+
+        def option(value: Optional[str]) -> str:
+            # Entries recorded before empty values were normalized may still hold the sniffed value
+            return _sql_literal("" if value in _CSV_EMPTY_OPTIONS else value)
+
+        columns = ", ".join(
+            f"{_sql_literal(column['name'])}: {_sql_literal(column['type'])}"
+            for column in schema["columns"]
+        )
+        options = [
+            "auto_detect = false",
+            f"delim = {option(schema['delimiter'])}",
+            f"quote = {option(schema['quote'])}",
+            f"escape = {option(schema['escape'])}",
+            f"new_line = {option(schema['new_line'])}",
+            f"skip = {int(schema['skip_rows'])}",
+            f"header = {_sql_literal(schema['has_header'])}",
+            f"columns = {{{columns}}}",
+        ]
+        if schema["date_format"]:
+            options.append(f"dateformat = {option(schema['date_format'])}")
+        if schema["timestamp_format"]:
+            options.append(f"timestampformat = {option(schema['timestamp_format'])}")
+        return f"read_csv('{file_path}', {', '.join(options)})", "read_csv (schema manifest)"
+
+    def _select_sql(self, table_name: str, source: str) -> str:
+        """Returns the query that loads a table from its source, applying its ingest spec and the sample mode.
+
+        The spec's filter and projection apply before the sample.  A hash sample is part of the filter; a random
+        sample is taken of the filtered rows through a subquery, as DuckDB applies USING SAMPLE before WHERE.
+        """
+        spec = self.table_specs.get(table_name, {})
+        columns = ", ".join(map(_quote_identifier, spec.get("columns") or [])) or "*"
+        conditions = [f"({spec['where']})"] if spec.get("where") else []
+        limit = spec.get("limit")
+        order = sample = ""
+        row_hash = f"hash(_row, {int(self.sample_seed)})"  # _row is the source row, before projection
+        if self.sample_method == "hash" and self.sample_percent is not None:
+            conditions.append(
+                f"{row_hash} % 1000000 < {round(self.sample_percent * 10_000)}"
+            )
+        elif self.sample_method == "hash" and self.sample_rows is not None:
+            order = f" ORDER BY {row_hash}"
+            limit = min(limit, self.sample_rows) if limit is not None else self.sample_rows
+        elif self.sample_percent is not None:
+            sample = f" USING SAMPLE bernoulli({self.sample_percent} PERCENT) REPEATABLE ({int(self.sample_seed)})"
+        elif self.sample_rows is not None:
+            sample = f" USING SAMPLE reservoir({int(self.sample_rows)} ROWS) REPEATABLE ({int(self.sample_seed)})"
+
+        sql = f"SELECT {columns} FROM {source} AS _row"
+        if conditions:
+            sql += f" WHERE {' AND '.join(conditions)}"
+        sql += order
+        if sample:
+            sql = f"SELECT * FROM ({sql}){sample}"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        return sql
+
+    def _sample_metadata(self) -> Dict[str, Any]:
+        """Returns the sample and sample_rate metadata of the tables loaded in the sample mode (None if off)."""
+        if self.sample_rows is not None:
+            return {
+                "sample": f"{self.sample_rows} rows ({self.sample_method}, seed {self.sample_seed})",
+                "sample_rate": None,  # Depends on the size of each file
+            }
+        if self.sample_percent is not None:
+            return {
+                "sample": f"{self.sample_percent}% ({self.sample_method}, seed {self.sample_seed})",
+                "sample_rate": self.sample_percent / 100,
+            }
+        return {"sample": None, "sample_rate": None}
+
+    def _remote_path(self, file: str) -> str:
+        """Returns the hf:// path of a repo file."""
+        return f"hf://datasets/{self.repo_id}/{file}"
+
+    def _download_file(self, file: str, local_dir: str) -> str:
+        """Downloads a repo file, at the loaded commit, into a local directory and returns its path."""
+        return hf_hub_download(
+            self.repo_id,
+            file,
+            repo_type="dataset",
+            revision=self.commit_sha,
+            local_dir=local_dir,
+        )
+
+    def cache_stats(self) -> Dict[str, float]:
+        """Returns the hit/miss counters and size of the local file cache.
+
+        Returns:
+            Dict[str, float]: The file cache statistics, or an empty dict if there is no file cache.
+        """
+        return self.file_cache.stats() if self.file_cache else {}
+
+    def _insert_metadata(
+        self, con: duckdb.DuckDBPyConnection, records: List[Dict[str, Any]]
+    ):
+        """Inserts metadata records, and the catalog rows they carry, in one batch and one transaction.
+
+        The records are written through an Arrow table.
+
+        Args:
+            con (duckdb.DuckDBPyConnection): The connection to write with.
+            records (List[Dict[str, Any]]): The metadata records, keyed by metadata column name, each with
+                optional lists of rows for each catalog table.
+        """
+        if not records:
+            return
+        batch = pa.Table.from_pylist(
+            [{name: record.get(name) for name in METADATA_COLUMNS} for record in records]
+        )
+        con.register("huggingduck_metadata_batch", batch)
+        try:
+            con.execute("BEGIN TRANSACTION;")
+            con.execute(
+                f"INSERT INTO {self.schema_name}.metadata BY NAME SELECT * FROM huggingduck_metadata_batch;"
+            )
+            for catalog in CATALOG_TABLES:
+                self._replace_catalog_rows(
+                    con,
+                    catalog,
+                    [row for record in records for row in record.get(catalog, [])],
+                )
+            con.execute("COMMIT;")
+        except Exception:
+            con.execute("ROLLBACK;")
+            raise
+        finally:
+            con.unregister("huggingduck_metadata_batch")
+
+    def _compact_table(
+        self, con: duckdb.DuckDBPyConnection, table_name: str
+    ) -> List[Dict[str, str]]:
+        """Rewrites a table with more compact column types, based on the values it holds.
+
+        String columns with at most enum_max_values distinct values (and at most half as many as their
+        non-NULL values) become ENUMs, and integer columns become the smallest signed integer type that holds their
+        range.  The ranges and distinct values of all columns are gathered by two aggregate queries, and the
+        table is rewritten once.
+
+        Args:
+            con (duckdb.DuckDBPyConnection): The connection (or cursor) to rewrite the table with.
+            table_name (str): The name of the table.
+
+        Returns:
+            List[Dict[str, str]]: The column_name, original_type and new_type of each converted column.
+        """
+        table = f"{self.schema_name}.{table_name}"
+        columns = [
+            (column_name, column_type)
+            for column_name, column_type in con.execute(
+                """
+                SELECT column_name, data_type FROM duckdb_columns()
+                WHERE schema_name = ? AND table_name = ?
+                ORDER BY column_index;
+                """,
+                [self.schema_name, table_name],
+            ).fetchall()
+            if column_type == "VARCHAR" or column_type in _INTEGER_TYPE_BYTES
+        ]
+        if not columns:
+            return []
+        ranges = con.execute(
+            "SELECT "
+            + ", ".join(
+                f"approx_count_distinct({_quote_identifier(name)}), count({_quote_identifier(name)})"
+                if column_type == "VARCHAR"
+                else f"min({_quote_identifier(name)})::HUGEINT, max({_quote_identifier(name)})::HUGEINT"
+                for name, column_type in columns
+            )
+            + f" FROM {table};"
+        ).fetchone()
+
+        new_types = {}
+        enum_candidates = []
+        for (name, column_type), (low, high) in zip(columns, zip(*[iter(ranges)] * 2)):
+            if column_type == "VARCHAR":
+                distinct, count = low, high
+                if distinct <= self.enum_max_values and 0 < distinct * 2 <= count:
+                    enum_candidates.append(name)
+            elif low is not None:
+                for compact_type, type_low, type_high in _COMPACT_INTEGER_TYPES:
+                    if type_low <= low and high <= type_high:
+                        if _INTEGER_TYPE_BYTES[compact_type] < _INTEGER_TYPE_BYTES[column_type]:
+                            new_types[name] = compact_type
+                        break
+        if enum_candidates:
+            values = con.execute(
+                "SELECT "
+                + ", ".join(
+                    f"list(DISTINCT {_quote_identifier(name)}) FILTER (WHERE {_quote_identifier(name)} IS NOT NULL)"
+                    for name in enum_candidates
+                )
+                + f" FROM {table};"
+            ).fetchone()
+            for name, column_values in zip(enum_candidates, values):
+                if len(column_values) <= self.enum_max_values:  # The distinct count was approximate
+                    new_types[name] = (
+                        "ENUM(" + ", ".join(map(_sql_literal, sorted(column_values))) + ")"
+                    )
+        if not new_types:
+            return []
+
+        replacements = ", ".join(
+            f"{_quote_identifier(name)}::{new_type} AS {_quote_identifier(name)}"
+            for name, new_type in new_types.items()
+        )
+        con.execute(
+            f"CREATE OR REPLACE TABLE {table} AS SELECT * REPLACE ({replacements}) FROM {table};"
+        )
+        logger.info(f"Compacted {len(new_types)} column types of table: {table}")
+        original_types = dict(columns)
+        return [
+            {
+                "column_name": name,
+                "original_type": original_types[name],
+                "new_type": new_type,
+            }
+            for name, new_type in new_types.items()
+        ]
+
+    def _compute_catalogs(
+        self, con: duckdb.DuckDBPyConnection, table_name: str
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """Computes the catalog rows of a freshly loaded table, for the catalogs that are enabled."""
+        catalogs = {}
+        if self.column_stats:
+            catalogs["column_stats"] = self._compute_column_stats(con, table_name)
+        if self.histograms:
+            (
+                catalogs["column_histograms"],
+                catalogs["column_quantiles"],
+            ) = self._compute_distributions(con, table_name)
+        return catalogs
+
+    def _compute_column_stats(
+        self, con: duckdb.DuckDBPyConnection, table_name: str
+    ) -> List[Dict[str, Any]]:
+        """Computes the statistics of every column of a table, in a single aggregate query (one scan).
+
+        Args:
+            con (duckdb.DuckDBPyConnection): The connection (or cursor) to query with.
+            table_name (str): The name of the table.
+
+        Returns:
+            List[Dict[str, Any]]: One row per column, keyed by column_stats column name.
+        """
+        columns = con.execute(
+            """
+            SELECT column_name, data_type FROM duckdb_columns()
+            WHERE schema_name = ? AND table_name = ?
+            ORDER BY column_index;
+            """,
+            [self.schema_name, table_name],
+        ).fetchall()
+        if not columns:
+            return []
+
+        aggregates = []
+        for column_name, column_type in columns:
+            column = _quote_identifier(column_name)
+            mean = f"avg({column})::DOUBLE" if _NUMERIC_TYPE.match(column_type) else "NULL"
+            aggregates.append(
+                f"min({column})::VARCHAR, max({column})::VARCHAR, count(*) - count({column}), "
+                f"approx_count_distinct({column}), {mean}"
+            )
+        values = con.execute(
+            f"SELECT {', '.join(aggregates)} FROM {self.schema_name}.{table_name};"
+        ).fetchone()
+
+        return [
+            {
+                "table_name": table_name,
+                "column_name": column_name,
+                "column_type": column_type,
+                "min_value": min_value,
+                "max_value": max_value,
+                "null_count": null_count,
+                "approx_distinct": approx_distinct,
+                "mean": mean,
+            }
+            for (column_name, column_type), (
+                min_value,
+                max_value,
+                null_count,
+                approx_distinct,
+                mean,
+            ) in zip(columns, zip(*[iter(values)] * 5))
+        ]
+
+    def _compute_distributions(
+        self, con: duckdb.DuckDBPyConnection, table_name: str
+    ) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Computes a fixed-width histogram and approximate quantiles of every numeric column of a table.
+
+        The quantiles and value ranges of all columns come from one aggregate query, and the histograms,
+        binned over those ranges, from a second one.
+
+        Args:
+            con (duckdb.DuckDBPyConnection): The connection (or cursor) to query with.
+            table_name (str): The name of the table.
+
+        Returns:
+            Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]: The column_histograms rows and the
+                column_quantiles rows of the table.
+        """
+        columns = [
+            column_name
+            for column_name, column_type in con.execute(
+                """
+                SELECT column_name, data_type FROM duckdb_columns()
+                WHERE schema_name = ? AND table_name = ?
+                ORDER BY column_index;
+                """,
+                [self.schema_name, table_name],
+            ).fetchall()
+            if _NUMERIC_TYPE.match(column_type)
+        ]
+        if not columns:
+            return [], []
+        quantiles = ", ".join(str(quantile) for quantile in QUANTILES)
+        ranges = con.execute(
+            "SELECT "
+            + ", ".join(
+                f"min({column})::DOUBLE, max({column})::DOUBLE, approx_quantile({column}::DOUBLE, [{quantiles}])"
+                for column in map(_quote_identifier, columns)
+            )
+            + f" FROM {self.schema_name}.{table_name};"
+        ).fetchone()
+        ranges = [
+            (column, low, high, values)
+            for column, (low, high, values) in zip(columns, zip(*[iter(ranges)] * 3))
+            if low is not None  # Columns with only NULLs have no distribution
+        ]
+        if not ranges:
+            return [], []
+        histograms = con.execute(
+            "SELECT "
+            + ", ".join(
+                f"histogram({_quote_identifier(column)}::DOUBLE, equi_width_bins({_sql_literal(low)}::DOUBLE, "
+                f"{_sql_literal(high)}::DOUBLE, {int(self.histogram_bins)}, false))"
+                for column, low, high, _ in ranges
+            )
+            + f" FROM {self.schema_name}.{table_name};"
+        ).fetchone()
+
+        histogram_rows, quantile_rows = [], []
+        for (column, low, _, values), histogram in zip(ranges, histograms):
+            lower_bound = low
+            for bin_index, (upper_bound, count) in enumerate(histogram.items()):
+                histogram_rows.append(
+                    {
+                        "table_name": table_name,
+                        "column_name": column,
+                        "bin_index": bin_index,
+                        "lower_bound": lower_bound,
+                        "upper_bound": upper_bound,
+                        "count": count,
+                    }
+                )
+                lower_bound = upper_bound
+            quantile_rows.extend(
+                {
+                    "table_name": table_name,
+                    "column_name": column,
+                    "quantile": quantile,
+                    "value": value,
+                }
+                for quantile, value in zip(QUANTILES, values)
+            )
+        return histogram_rows, quantile_rows
+
+    def _replace_catalog_rows(
+        self, con: duckdb.DuckDBPyConnection, catalog: str, rows: List[Dict[str, Any]]
     ):
+        """Replaces the rows of a catalog table for the tables in the given rows (within the caller's transaction)."""
+        if not rows:
+            return
+        columns = CATALOG_TABLES[catalog]
+        for table_name in {row["table_name"] for row in rows}:
+            con.execute(
+                f"DELETE FROM {self.schema_name}.{catalog} WHERE table_name = ?;",
+                [table_name],
+            )
+        con.executemany(
+            f"""
+            INSERT INTO {self.schema_name}.{catalog} ({", ".join(columns)})
+            VALUES ({", ".join("?" for _ in columns)});
+            """,
+            [[row[name] for name in columns] for row in rows],
+        )
+
+    def get_column_stats(self, table_name: Optional[str] = None) -> pd.DataFrame:
+        """Returns the column statistics recorded when tables were loaded, without scanning the tables.
+
+        A lazy table is materialized first, since its statistics are recorded when its data is loaded.
+
+        Args:
+            table_name (str, optional): The table to return the statistics of. Defaults to None (all tables).
+
+        Returns:
+            pd.DataFrame: The table_name, column_name, column_type, min_value, max_value, null_count,
+                approx_distinct and mean of each column.
         """
-        Initializes the HuggingDuckDBConnection connection.
+        return self._read_catalog("column_stats", table_name)
+
+    def get_histogram(
+        self, table_name: str, column_name: Optional[str] = None
+    ) -> pd.DataFrame:
+        """Returns the histograms recorded when a table was loaded (requires histograms=True).
 
         Args:
-            repo_id (str): Hugging Face repository ID (e.g., "mjboothaus/titanic-databooth").
-            db_path (str, optional): Path to the .duckdb file for persistence. Defaults to None (in-memory).
-            file_filters (Union[str, List[str]], optional): File extensions to filter by. Defaults to None.
-            force_recreate (bool, optional): Whether to force recreation of the database. Defaults to False.
+            table_name (str): The table to return the histograms of.
+            column_name (str, optional): The column to return the histogram of. Defaults to None (all numeric
+                columns).
+
+        Returns:
+            pd.DataFrame: The table_name, column_name, bin_index, lower_bound, upper_bound and count of each bin.
         """
-        self.repo_id = repo_id
-        self.db_path = db_path
-        self.file_filters = file_filters
-        self.force_recreate = force_recreate
-        self.con = self._connect()  # Establish connection immediately
+        return self._read_catalog("column_histograms", table_name, column_name)
 
-    def _connect(self) -> duckdb.DuckDBPyConnection:
+    def get_quantiles(
+        self, table_name: str, column_name: Optional[str] = None
+    ) -> pd.DataFrame:
+        """Returns the approximate quantiles recorded when a table was loaded (requires histograms=True).
+
+        Args:
+            table_name (str): The table to return the quantiles of.
+            column_name (str, optional): The column to return the quantiles of. Defaults to None (all numeric
+                columns).
+
+        Returns:
+            pd.DataFrame: The table_name, column_name, quantile and value of each quantile.
         """
-        Establishes a DuckDB connection and sets up the schema, with optional persistence.
+        return self._read_catalog("column_quantiles", table_name, column_name)
+
+    def _read_catalog(
+        self,
+        catalog: str,
+        table_name: Optional[str] = None,
+        column_name: Optional[str] = None,
+    ) -> pd.DataFrame:
+        """Reads the rows of a catalog table, materializing the table they describe if it is still lazy."""
+        conditions, params = [], []
+        if table_name is not None:
+            self.materialize(table_name)  # Catalog rows are recorded when the data is loaded
+            conditions.append("table_name = ?")
+            params.append(table_name)
+        if column_name is not None:
+            conditions.append("column_name = ?")
+            params.append(column_name)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        order = {
+            "column_stats": "table_name",  # Columns stay in table order
+            "column_histograms": "table_name, column_name, bin_index",
+            "column_quantiles": "table_name, column_name, quantile",
+        }[catalog]
+        return (
+            self._thread_con()
+            .execute(
+                f"SELECT * FROM {self.schema_name}.{catalog}{where} ORDER BY {order};",
+                params,
+            )
+            .fetchdf()
+        )
+
+    def _thread_state(self) -> Dict[str, Any]:
+        """Returns the calling thread's cursor and prepared statements, creating them on first use.
+
+        Each thread queries through its own cursor of the shared database, so concurrent sessions run
+        their queries in parallel (on DuckDB's shared worker pool) instead of queueing on one connection.
+        Cursors of threads that have exited are closed as new ones are created.  The memory-mapped Arrow tables
+        of zero-copy views are registered on each cursor, as registrations are not shared between cursors.
 
         Returns:
-            duckdb.DuckDBPyConnection: A DuckDB connection instance.
+            Dict[str, Any]: The thread's "cursor", its "prepared" statements (SQL text -> statement name) and
+                the "generation" of those statements.
+        """
+        thread = threading.current_thread()
+        with self._registry_lock:
+            state = self._cursors.get(thread.ident)
+            if state is not None and state["thread"] is thread:
+                if state["mapped_generation"] != self._mapped_generation:
+                    for name, table in self._mapped_tables.items():
+                        state["cursor"].register(name, table)
+                    state["mapped_generation"] = self._mapped_generation
+                return state
+
+            for ident, stale in list(self._cursors.items()):
+                if not stale["thread"].is_alive():
+                    stale["cursor"].close()
+                    del self._cursors[ident]
+
+            cursor = self.con.cursor()
+            cursor.execute(f"SET search_path = '{self.schema_name}';")
+            for name, table in self._mapped_tables.items():
+                cursor.register(name, table)
+            state = {
+                "thread": thread,
+                "cursor": cursor,
+                "prepared": OrderedDict(),
+                "generation": self._prepared_generation,
+                "mapped_generation": self._mapped_generation,
+            }
+            self._cursors[thread.ident] = state
+            return state
+
+    def _thread_con(self) -> duckdb.DuckDBPyConnection:
+        """Returns the calling thread's cursor."""
+        return self._thread_state()["cursor"]
+
+    def _execute(
+        self, sql: str, params: Optional[QueryParams] = None
+    ) -> duckdb.DuckDBPyConnection:
+        """Executes a statement on the calling thread's cursor, reusing a cached prepared statement when it has parameters.
+
+        Parameterized statements are prepared once per SQL text (PREPARE) and then run with EXECUTE, so
+        repeated query shapes skip parsing and planning.  Parameters without a literal form (e.g. lists)
+        are bound directly instead.
         """
+        state = self._thread_state()
+        con = state["cursor"]
+        if params is None:
+            return con.execute(sql)
         try:
-            # Determine connection method
-            if self.db_path:
-                db_exists = os.path.exists(self.db_path)
-                con = duckdb.connect(database=self.db_path, read_only=False)
-                logger.info(f"Connected to DuckDB database file: {self.db_path}")
+            if isinstance(params, dict):
+                args = ", ".join(
+                    f"{name} := {_sql_literal(value)}" for name, value in params.items()
+                )
             else:
-                db_exists = False  # In memory databases do not exist
-                con = duckdb.connect(database=":memory:", read_only=False)
-                logger.info("Connected to in-memory DuckDB database.")
+                args = ", ".join(_sql_literal(value) for value in params)
+        except TypeError:
+            return con.execute(sql, params)
+        statement = self._prepare(state, sql)
+        return con.execute(f"EXECUTE {statement}({args});" if args else f"EXECUTE {statement};")
 
-            self.schema_name = self.repo_id.replace("/", "_").replace(
-                "-", "_"
-            )  # Create a valid schema name
+    def _prepare(self, state: Dict[str, Any], sql: str) -> str:
+        """Returns the name of the prepared statement for a SQL text on a thread's cursor, preparing it on a cache miss."""
+        con, prepared = state["cursor"], state["prepared"]
+        if state["generation"] != self._prepared_generation:
+            for statement in prepared.values():
+                con.execute(f"DEALLOCATE {statement};")
+            prepared.clear()
+            state["generation"] = self._prepared_generation
 
-            # Check if we should recreate the database
-            if self.force_recreate or not db_exists:
-                con.execute(f"CREATE SCHEMA IF NOT EXISTS {self.schema_name};")
-                con.execute(
-                    f"SET search_path = '{self.schema_name}';"
-                )  # Set schema as the default
-
-                # Create metadata table
-                con.execute(f"""
-                    CREATE TABLE IF NOT EXISTS {self.schema_name}.metadata (
-                        file_name VARCHAR,
-                        file_size INTEGER,
-                        file_type VARCHAR,
-                        row_count INTEGER,
-                        is_loaded BOOLEAN
-                    );
-                """)
-                # Load metadata and (optionally) data for all files in the repo
-                self._load_all_datasets(con)
-            else:
-                # Database exists, skip loading data
-                con.execute(
-                    f"SET search_path = '{self.schema_name}';"
-                )  # Set schema as the default
-                logger.info(
-                    f"Using existing database.  Skipping data load from Hugging Face. To force reload, set force_recreate=True"
-                )
+        statement = prepared.get(sql)
+        if statement is not None:
+            prepared.move_to_end(sql)
+            return statement
 
-            return con
-        except Exception as e:
-            logger.error(f"Connection error: {e}")
-            raise
+        statement = f"huggingduck_stmt_{next(self._statement_ids)}"
+        con.execute(f"PREPARE {statement} AS {sql.strip().rstrip(';')}")
+        prepared[sql] = statement
+        if len(prepared) > self.prepared_cache_size:
+            _, evicted = prepared.popitem(last=False)
+            con.execute(f"DEALLOCATE {evicted};")
+        return statement
 
-    def _load_all_datasets(self, con: duckdb.DuckDBPyConnection):
-        """Loads metadata and (optionally) data for all qualifying files in the Hugging Face repo."""
-        files = self.list_files_in_huggingface_repo(
-            self.repo_id, self.file_filters
-        )  # Get filtered list of files
+    def _clear_prepared(self):
+        """Invalidates the prepared statements of every thread (e.g. after tables were replaced).
 
-        for file in files:
-            try:
-                file_path = f"hf://datasets/{self.repo_id}/{file}"
-                table_name = os.path.splitext(os.path.basename(file))[
-                    0
-                ]  # Derive table name from file name
+        Each thread deallocates its own statements the next time it prepares one.
+        """
+        self._prepared_generation += 1
 
-                # Create table for the data, and load the data set
-                con.execute(
-                    f"CREATE TABLE IF NOT EXISTS {self.schema_name}.{table_name} AS SELECT * FROM '{file_path}'"
-                )
+    def _cached_result(
+        self,
+        kind: str,
+        sql: str,
+        params: Optional[QueryParams],
+        run: Callable[[], Union[pd.DataFrame, pa.Table]],
+    ) -> Union[pd.DataFrame, pa.Table]:
+        """Returns a query result from the result cache, running the query on a miss.
 
-                # Get row count using SQL query
-                row_count = con.execute(
-                    f"SELECT count(*) FROM {self.schema_name}.{table_name}"
-                ).fetchone()[0]
+        Only read-only statements are cached; any other statement invalidates the cache.  DataFrames are
+        copied on the way out, so callers cannot modify the cached copy.
 
-                # Get file size  The is is tricky and can be solved as an enhancement
-                file_size = 0
+        Args:
+            kind (str): The result format ("pandas" or "arrow"), part of the cache key.
+            sql (str): The SQL query.
+            params (QueryParams, optional): The query parameters.
+            run (Callable[[], Union[pd.DataFrame, pa.Table]]): Runs the query and returns its result.
+        """
+        if self.result_cache is None:
+            return run()
+        if not _READ_ONLY_SQL.match(sql):
+            result = run()
+            self._invalidate_results()  # The statement may have changed the data
+            return result
+
+        key = (
+            kind,
+            _normalize_sql(sql),
+            repr(params),
+            self.commit_sha,
+            self._data_version,
+        )
+        result = self.result_cache.get(key)
+        if result is None:
+            result = run()
+            nbytes = (
+                int(result.memory_usage(deep=True).sum())
+                if isinstance(result, pd.DataFrame)
+                else result.nbytes
+            )
+            self.result_cache.put(key, result, nbytes)
+        return result.copy() if isinstance(result, pd.DataFrame) else result
 
-                # Get file type
-                file_type = file.split(".")[-1].lower()
+    def _invalidate_results(self):
+        """Moves to a new dataset version, dropping all cached query results."""
+        self._data_version += 1
+        if self.result_cache is not None:
+            self.result_cache.clear()
 
-                # Add metadata
-                con.execute(f"""
-                    INSERT INTO {self.schema_name}.metadata (file_name, file_size, file_type, row_count, is_loaded)
-                    VALUES ('{file}', {file_size}, '{file_type}', {row_count}, TRUE);
-                """)
-                logger.info(
-                    f"Loaded dataset into table: {self.schema_name}.{table_name}"
-                )
+    def result_cache_stats(self) -> Dict[str, float]:
+        """Returns the hit/miss counters and size of the query result cache.
 
-            except Exception as e:
-                logger.error(f"Error loading dataset {file}: {e}")
-                con.execute(f"""
-                    INSERT INTO {self.schema_name}.metadata (file_name, file_size, file_type, row_count, is_loaded)
-                    VALUES ('{file}', 0, 'unknown', 0, FALSE);
-                """)
+        Returns:
+            Dict[str, float]: The result cache statistics, or an empty dict if there is no result cache.
+        """
+        return self.result_cache.stats() if self.result_cache else {}
 
-    def query(self, sql: str) -> pd.DataFrame:
+    def query(self, sql: str, params: Optional[QueryParams] = None) -> pd.DataFrame:
         """
         Executes a SQL query against the DuckDB connection.
+
+        Args:
+            sql (str): The SQL query to execute, with ? or $name placeholders for any parameters.
+            params (QueryParams, optional): Positional (sequence) or named (dict) parameters to bind.
+                Defaults to None.
         """
         try:
             logger.debug(f"Executing query: {sql}")
-            df = self.con.execute(sql).fetchdf()
+            self._materialize_referenced(sql)
+            df = self._cached_result(
+                "pandas",
+                sql,
+                params,
+                lambda: self._execute(sql, params).fetchdf(),
+            )
             logger.info(f"Successfully executed query:\n{sql}")
             return df
         except Exception as e:
             logger.error(f"Query execution error: {e}")
             raise
 
-    def sql_df(self, sql: str) -> pd.DataFrame:
+    def sql_df(self, sql: str, params: Optional[QueryParams] = None) -> pd.DataFrame:
         """
         Executes a SQL query and returns the result as a Pandas DataFrame.
         """
         try:
             logger.debug(f"Executing query: {sql}")
-            df = self.con.sql(sql).df()
+            self._materialize_referenced(sql)
+            if params is None:
+                df = self._cached_result(
+                    "pandas", sql, params, lambda: self._thread_con().sql(sql).df()
+                )
+            else:
+                df = self._cached_result(
+                    "pandas",
+                    sql,
+                    params,
+                    lambda: self._execute(sql, params).fetchdf(),
+                )
             logger.info(f"Successfully executed query:\n{sql}")
             return df
         except Exception as e:
             logger.error(f"Query execution error: {e}")
             raise
 
+    def query_arrow(self, sql: str, params: Optional[QueryParams] = None) -> pa.Table:
+        """
+        Executes a SQL query and returns the result as a pyarrow Table, without converting to pandas.
+        """
+        try:
+            logger.debug(f"Executing query: {sql}")
+            self._materialize_referenced(sql)
+            table = self._cached_result(
+                "arrow",
+                sql,
+                params,
+                lambda: self._execute(sql, params).fetch_arrow_table(),
+            )
+            logger.info(f"Successfully executed query:\n{sql}")
+            return table
+        except Exception as e:
+            logger.error(f"Query execution error: {e}")
+            raise
+
+    def query_batches(
+        self,
+        sql: str,
+        batch_size: int = 1_000_000,
+        params: Optional[QueryParams] = None,
+    ) -> pa.RecordBatchReader:
+        """
+        Executes a SQL query and streams the result as Arrow record batches.
+
+        The query runs on its own cursor, so other queries on this connection do not invalidate the stream.
+
+        Args:
+            sql (str): The SQL query to execute.
+            batch_size (int, optional): Maximum number of rows per record batch. Defaults to 1,000,000.
+            params (QueryParams, optional): Parameters to bind. Defaults to None.
+
+        Returns:
+            pa.RecordBatchReader: A reader yielding the result one record batch at a time.
+        """
+        try:
+            logger.debug(f"Executing query: {sql}")
+            self._materialize_referenced(sql)
+            cursor = self.con.cursor()
+            cursor.execute(f"SET search_path = '{self.schema_name}';")
+            with self._registry_lock:
+                mapped_tables = list(self._mapped_tables.items())
+            for name, table in mapped_tables:
+                cursor.register(name, table)  # As on the threads' cursors (see _thread_state)
+            reader = cursor.execute(sql, params).fetch_record_batch(batch_size)
+            logger.info(f"Successfully started streaming query:\n{sql}")
+            return reader
+        except Exception as e:
+            logger.error(f"Query execution error: {e}")
+            raise
+
+    def iter_query(
+        self,
+        sql: str,
+        chunk_size: int = 100_000,
+        output: str = "pandas",
+        params: Optional[QueryParams] = None,
+    ) -> Iterator[Union[pd.DataFrame, pa.RecordBatch, Dict[str, Any]]]:
+        """
+        Executes a SQL query and yields the result in chunks, so memory is bounded by the chunk size
+        rather than the size of the result.
+
+        Args:
+            sql (str): The SQL query to execute.
+            chunk_size (int, optional): Maximum number of rows per chunk. Defaults to 100,000.
+            output (str, optional): The chunk format: "pandas" (DataFrame), "arrow" (RecordBatch) or
+                "numpy" (dict of column name to NumPy array). Defaults to "pandas".
+            params (QueryParams, optional): Parameters to bind. Defaults to None.
+
+        Returns:
+            Iterator[Union[pd.DataFrame, pa.RecordBatch, Dict[str, Any]]]: The result chunks.
+        """
+        if output not in ("pandas", "arrow", "numpy"):
+            raise ValueError(
+                f"output must be 'pandas', 'arrow' or 'numpy', not {output!r}"
+            )
+        reader = self.query_batches(sql, batch_size=chunk_size, params=params)
+        return self._iter_chunks(reader, output)
+
+    @staticmethod
+    def _iter_chunks(
+        reader: pa.RecordBatchReader, output: str
+    ) -> Iterator[Union[pd.DataFrame, pa.RecordBatch, Dict[str, Any]]]:
+        """Converts the record batches of a reader to the requested chunk format as they are read."""
+        for batch in reader:
+            if output == "arrow":
+                yield batch
+            elif output == "pandas":
+                yield batch.to_pandas()
+            else:
+                yield {
+                    name: column.to_numpy(zero_copy_only=False)
+                    for name, column in zip(batch.schema.names, batch.columns)
+                }
+
     def list_files_in_huggingface_repo(
         self, repo_id: str, file_filters: Union[str, List[str]] = None
     ) -> List[str]:
@@ -179,47 +2398,113 @@ class HuggingDuckDBConnection:
         try:
             api = HfApi()
             repo_files = api.list_repo_files(repo_id, repo_type="dataset")
-
-            if file_filters:
-                if isinstance(file_filters, str):
-                    file_filters = [
-                        file_filters
-                    ]  # Convert to a list if it's a single string
-
-                filtered_files = []
-                for file in repo_files:
-                    for file_filter in file_filters:
-                        if file.endswith(f".{file_filter}"):
-                            filtered_files.append(file)
-                            break  # Once a match is found, move to the next file
-                return filtered_files
-            else:
-                return repo_files  # No filter, return all files
+            return _filter_files(repo_files, file_filters)
 
         except Exception as e:
             logger.error(f"An error occurred: {e}")
             return []
 
     def get_table_names(self, exclude_metadata: bool = True) -> List[str]:
-        """Retrieves the table names from the DuckDB connection, optionally excluding the metadata table.
+        """Retrieves the table names from the DuckDB connection, optionally excluding the metadata tables.
 
         Args:
-            exclude_metadata (bool, optional): Whether to exclude the metadata table from the results. Defaults to True.
+            exclude_metadata (bool, optional): Whether to exclude the metadata and catalog tables from the
+                results. Defaults to True.
 
         Returns:
             List[str]: A list of table names in the database.
         """
         try:
-            table_names = self.con.execute("SHOW TABLES").fetchdf()["name"].tolist()
+            table_names = (
+                self._thread_con().execute("SHOW TABLES").fetchdf()["name"].tolist()
+            )
             if exclude_metadata:
-                table_names = [name for name in table_names if name != "metadata"]
+                table_names = [
+                    name
+                    for name in table_names
+                    if name not in ("metadata", "csv_schemas")
+                    and name not in CATALOG_TABLES
+                    and not name.startswith("huggingduck_")
+                ]
             return table_names
         except Exception as e:
             logger.error(f"Error retrieving table names: {e}")
             return []
 
+    @classmethod
+    async def aconnect(cls, *args, **kwargs) -> "HuggingDuckDBConnection":
+        """
+        Creates a connection without blocking the event loop, running the initial ingest in a worker thread.
+
+        Args:
+            *args, **kwargs: Parameters for HuggingDuckDBConnection.
+        """
+        return await asyncio.to_thread(cls, *args, **kwargs)
+
+    async def aquery(
+        self, sql: str, params: Optional[QueryParams] = None
+    ) -> pd.DataFrame:
+        """
+        Executes a SQL query on the async executor and returns the result as a Pandas DataFrame.
+
+        Cancelling the awaiting task interrupts the query.
+        """
+        return await self._run_async(self.query, sql, params)
+
+    async def aquery_arrow(
+        self, sql: str, params: Optional[QueryParams] = None
+    ) -> pa.Table:
+        """
+        Executes a SQL query on the async executor and returns the result as a pyarrow Table.
+
+        Cancelling the awaiting task interrupts the query.
+        """
+        return await self._run_async(self.query_arrow, sql, params)
+
+    async def amaterialize(self, table_name: str):
+        """
+        Materializes a lazily registered table on the async executor.
+        """
+        await self._run_async(self.materialize, table_name, interruptible=False)
+
+    async def arefresh(self) -> Dict[str, List[str]]:
+        """
+        Runs an incremental refresh on the async executor.
+
+        Returns:
+            Dict[str, List[str]]: The "added", "changed" and "deleted" file names.
+        """
+        return await self._run_async(self.refresh, interruptible=False)
+
+    async def _run_async(self, func: Callable, *args, interruptible: bool = True) -> Any:
+        """Runs a blocking call on the async executor, which bounds the number of calls running at once.
+
+        If the awaiting task is cancelled before the call starts, it never runs.  If it is cancelled while
+        running, an interruptible call has its query interrupted through the worker thread's cursor; other
+        calls (ingest) run to completion in the background.
+        """
+        worker = {}
+
+        def call():
+            worker["cursor"] = self._thread_con()
+            return func(*args)
+
+        future = asyncio.get_running_loop().run_in_executor(self._async_executor, call)
+        try:
+            return await future
+        except asyncio.CancelledError:
+            if interruptible and "cursor" in worker:
+                worker["cursor"].interrupt()
+                logger.info("Interrupted cancelled query.")
+            raise
+
     def close(self):
-        """Closes the DuckDB connection."""
+        """Closes the DuckDB connection, along with every thread's cursor."""
+        self._async_executor.shutdown(wait=True, cancel_futures=True)
+        with self._registry_lock:
+            for state in self._cursors.values():
+                state["cursor"].close()
+            self._cursors.clear()
         if self.con:
             self.con.close()
             logger.info("DuckDB connection closed.")
@@ -228,6 +2513,8 @@ class HuggingDuckDBConnection:
 class HuggingDuckDBStConnection(BaseConnection[HuggingDuckDBConnection]):
     """
     Streamlit-specific connection class that leverages HuggingDuckDBConnection for interacting with Hugging Face datasets.
+
+    The connection is shared by every session, but each session's script thread queries through its own cursor.
     """
 
     def _connect(self, **kwargs) -> HuggingDuckDBConnection:
@@ -235,7 +2522,12 @@ class HuggingDuckDBStConnection(BaseConnection[HuggingDuckDBConnection]):
         Establishes the connection using parameters from secrets or kwargs.
 
         Args:
-            **kwargs: Parameters for HuggingDuckDBConnection (repo_id, db_path, file_filters, force_recreate).
+            **kwargs: Parameters for HuggingDuckDBConnection (repo_id, db_path, file_filters, force_recreate,
+                max_workers, lazy, cache_dir, cache_max_bytes, prepared_cache_size, result_cache_bytes,
+                threads, column_stats, histograms, histogram_bins, parquet_cache, parquet_row_group_size,
+                parquet_branch, schema_manifest, compact_types, enum_max_values, table_specs, sample_rows,
+                sample_percent, sample_method, sample_seed, group_files, datasets_cache, datasets_cache_dir,
+                configs).
         """
         repo_id = kwargs.get("repo_id", st.secrets.get("repo_id"))
         db_path = kwargs.get("db_path", st.secrets.get("db_path"))
@@ -243,6 +2535,55 @@ class HuggingDuckDBStConnection(BaseConnection[HuggingDuckDBConnection]):
         force_recreate = kwargs.get(
             "force_recreate", st.secrets.get("force_recreate", False)
         )
+        max_workers = kwargs.get("max_workers", st.secrets.get("max_workers"))
+        lazy = kwargs.get("lazy", st.secrets.get("lazy", False))
+        cache_dir = kwargs.get("cache_dir", st.secrets.get("cache_dir"))
+        cache_max_bytes = kwargs.get(
+            "cache_max_bytes", st.secrets.get("cache_max_bytes", 10 * 1024**3)
+        )
+        prepared_cache_size = kwargs.get(
+            "prepared_cache_size", st.secrets.get("prepared_cache_size", 128)
+        )
+        result_cache_bytes = kwargs.get(
+            "result_cache_bytes", st.secrets.get("result_cache_bytes")
+        )
+        threads = kwargs.get("threads", st.secrets.get("threads"))
+        column_stats = kwargs.get("column_stats", st.secrets.get("column_stats", True))
+        histograms = kwargs.get("histograms", st.secrets.get("histograms", False))
+        histogram_bins = kwargs.get(
+            "histogram_bins", st.secrets.get("histogram_bins", 20)
+        )
+        parquet_cache = kwargs.get("parquet_cache", st.secrets.get("parquet_cache", False))
+        parquet_row_group_size = kwargs.get(
+            "parquet_row_group_size", st.secrets.get("parquet_row_group_size", 122_880)
+        )
+        parquet_branch = kwargs.get(
+            "parquet_branch", st.secrets.get("parquet_branch", False)
+        )
+        schema_manifest = kwargs.get(
+            "schema_manifest", st.secrets.get("schema_manifest", True)
+        )
+        compact_types = kwargs.get(
+            "compact_types", st.secrets.get("compact_types", False)
+        )
+        enum_max_values = kwargs.get(
+            "enum_max_values", st.secrets.get("enum_max_values", 256)
+        )
+        table_specs = kwargs.get("table_specs", st.secrets.get("table_specs"))
+        sample_rows = kwargs.get("sample_rows", st.secrets.get("sample_rows"))
+        sample_percent = kwargs.get("sample_percent", st.secrets.get("sample_percent"))
+        sample_method = kwargs.get(
+            "sample_method", st.secrets.get("sample_method", "random")
+        )
+        sample_seed = kwargs.get("sample_seed", st.secrets.get("sample_seed", 42))
+        group_files = kwargs.get("group_files", st.secrets.get("group_files", True))
+        datasets_cache = kwargs.get(
+            "datasets_cache", st.secrets.get("datasets_cache", False)
+        )
+        datasets_cache_dir = kwargs.get(
+            "datasets_cache_dir", st.secrets.get("datasets_cache_dir")
+        )
+        configs = kwargs.get("configs", st.secrets.get("configs"))
 
         if not repo_id:
             st.error("repo_id is required (provide via kwargs or secrets.toml)")
@@ -254,6 +2595,31 @@ class HuggingDuckDBStConnection(BaseConnection[HuggingDuckDBConnection]):
                 db_path=db_path,
                 file_filters=file_filters,
                 force_recreate=force_recreate,
+                max_workers=max_workers,
+                lazy=lazy,
+                cache_dir=cache_dir,
+                cache_max_bytes=cache_max_bytes,
+                prepared_cache_size=prepared_cache_size,
+                result_cache_bytes=result_cache_bytes,
+                threads=threads,
+                column_stats=column_stats,
+                histograms=histograms,
+                histogram_bins=histogram_bins,
+                parquet_cache=parquet_cache,
+                parquet_row_group_size=parquet_row_group_size,
+                parquet_branch=parquet_branch,
+                schema_manifest=schema_manifest,
+                compact_types=compact_types,
+                enum_max_values=enum_max_values,
+                table_specs=table_specs,
+                sample_rows=sample_rows,
+                sample_percent=sample_percent,
+                sample_method=sample_method,
+                sample_seed=sample_seed,
+                group_files=group_files,
+                datasets_cache=datasets_cache,
+                datasets_cache_dir=datasets_cache_dir,
+                configs=configs,
             )
             st.info(f"Connected to HuggingFace repo: {repo_id}")
             return hdb
@@ -261,22 +2627,74 @@ class HuggingDuckDBStConnection(BaseConnection[HuggingDuckDBConnection]):
             st.error(f"Connection failed: {e}")
             raise
 
-    def query(self, sql: str, ttl: int = 3600) -> pd.DataFrame:
+    def query(
+        self, sql: str, ttl: int = 3600, params: Optional[QueryParams] = None
+    ) -> pd.DataFrame:
         """
         Executes a SQL query against the HuggingDuckDBConnection connection, with caching.
         """
 
         @st.cache_data(ttl=ttl)
-        def _query(sql: str) -> pd.DataFrame:
+        def _query(sql: str, params: Optional[QueryParams]) -> pd.DataFrame:
             try:
-                df = self._instance.query(sql)
+                df = self._instance.query(sql, params)
                 st.info(f"Successfully executed query:\n{sql}")
                 return df
             except Exception as e:
                 st.error(f"Query execution error: {e}")
                 raise
 
-        return _query(sql)
+        return _query(sql, params)
+
+    def query_arrow(
+        self, sql: str, ttl: int = 3600, params: Optional[QueryParams] = None
+    ) -> pa.Table:
+        """
+        Executes a SQL query and returns the result as a pyarrow Table, with caching.
+        """
+
+        @st.cache_data(ttl=ttl)
+        def _query_arrow(sql: str, params: Optional[QueryParams]) -> pa.Table:
+            try:
+                table = self._instance.query_arrow(sql, params)
+                st.info(f"Successfully executed query:\n{sql}")
+                return table
+            except Exception as e:
+                st.error(f"Query execution error: {e}")
+                raise
+
+        return _query_arrow(sql, params)
+
+    def query_batches(
+        self,
+        sql: str,
+        batch_size: int = 1_000_000,
+        params: Optional[QueryParams] = None,
+    ) -> pa.RecordBatchReader:
+        """
+        Executes a SQL query and streams the result as Arrow record batches (not cached).
+        """
+        try:
+            return self._instance.query_batches(sql, batch_size, params)
+        except Exception as e:
+            st.error(f"Query execution error: {e}")
+            raise
+
+    def iter_query(
+        self,
+        sql: str,
+        chunk_size: int = 100_000,
+        output: str = "pandas",
+        params: Optional[QueryParams] = None,
+    ) -> Iterator[Union[pd.DataFrame, pa.RecordBatch, Dict[str, Any]]]:
+        """
+        Executes a SQL query and yields the result in chunks of pandas, Arrow or NumPy data (not cached).
+        """
+        try:
+            return self._instance.iter_query(sql, chunk_size, output, params)
+        except Exception as e:
+            st.error(f"Query execution error: {e}")
+            raise
 
     def list_files_in_huggingface_repo(
         self, repo_id: str, file_filters: Union[str, List[str]] = None
@@ -300,10 +2718,11 @@ class HuggingDuckDBStConnection(BaseConnection[HuggingDuckDBConnection]):
             return []
 
     def get_table_names(self, exclude_metadata: bool = True) -> List[str]:
-        """Retrieves the table names from the DuckDB connection, optionally excluding the metadata table.
+        """Retrieves the table names from the DuckDB connection, optionally excluding the metadata tables.
 
         Args:
-            exclude_metadata (bool, optional): Whether to exclude the metadata table from the results. Defaults to True.
+            exclude_metadata (bool, optional): Whether to exclude the metadata and catalog tables from the
+                results. Defaults to True.
 
         Returns:
             List[str]: A list of table names in the database.
@@ -315,6 +2734,74 @@ class HuggingDuckDBStConnection(BaseConnection[HuggingDuckDBConnection]):
             st.error(f"Error retrieving table names: {e}")
             return []
 
+    def get_column_stats(self, table_name: Optional[str] = None) -> pd.DataFrame:
+        """Returns the column statistics recorded when tables were loaded, without scanning the tables.
+
+        Args:
+            table_name (str, optional): The table to return the statistics of. Defaults to None (all tables).
+
+        Returns:
+            pd.DataFrame: The statistics of each column, or an empty DataFrame on error.
+        """
+        try:
+            return self._instance.get_column_stats(table_name)
+        except Exception as e:
+            st.error(f"Error retrieving column statistics: {e}")
+            return pd.DataFrame()
+
+    def get_histogram(
+        self, table_name: str, column_name: Optional[str] = None
+    ) -> pd.DataFrame:
+        """Returns the histograms recorded when a table was loaded, for charts that need no scan of the table.
+
+        Args:
+            table_name (str): The table to return the histograms of.
+            column_name (str, optional): The column to return the histogram of. Defaults to None (all numeric
+                columns).
+
+        Returns:
+            pd.DataFrame: The bins of each histogram, or an empty DataFrame on error.
+        """
+        try:
+            return self._instance.get_histogram(table_name, column_name)
+        except Exception as e:
+            st.error(f"Error retrieving histogram: {e}")
+            return pd.DataFrame()
+
+    def get_quantiles(
+        self, table_name: str, column_name: Optional[str] = None
+    ) -> pd.DataFrame:
+        """Returns the approximate quantiles recorded when a table was loaded.
+
+        Args:
+            table_name (str): The table to return the quantiles of.
+            column_name (str, optional): The column to return the quantiles of. Defaults to None (all numeric
+                columns).
+
+        Returns:
+            pd.DataFrame: The quantiles of each column, or an empty DataFrame on error.
+        """
+        try:
+            return self._instance.get_quantiles(table_name, column_name)
+        except Exception as e:
+            st.error(f"Error retrieving quantiles: {e}")
+            return pd.DataFrame()
+
+    def refresh(self) -> Dict[str, List[str]]:
+        """Reloads only the files that changed in the Hugging Face repo, clearing cached query results if any did.
+
+        Returns:
+            Dict[str, List[str]]: The "added", "changed" and "deleted" file names.
+        """
+        try:
+            changes = self._instance.refresh()
+            if any(changes.values()):
+                st.cache_data.clear()
+            return changes
+        except Exception as e:
+            st.error(f"Refresh error: {e}")
+            raise
+
     def close(self):
         """Closes the DuckDB connection."""
         self._instance.close()  # Call the close method of the HuggingDuckDBConnection instance
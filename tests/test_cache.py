@@ -0,0 +1,99 @@
+import os
+
+import pytest
+
+from huggingduck.cache import FileCache, ResultCache
+
+
+def _put(cache: FileCache, tmp_path, key: str, size: int, mtime: float = None) -> str:
+    """Writes a file of the given size and moves it into the cache, optionally backdating it."""
+    source = tmp_path / f"{key}.src"
+    source.write_bytes(b"x" * size)
+    path = cache.put(key, str(source), ".csv")
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+    return path
+
+
+@pytest.fixture
+def file_cache(tmp_path):
+    return FileCache(str(tmp_path / "cache"), max_bytes=10)
+
+
+def test_file_cache_counts_hits_and_misses(file_cache, tmp_path):
+    assert file_cache.get("aa11", ".csv") is None
+    path = _put(file_cache, tmp_path, "aa11", 4)
+
+    assert file_cache.get("aa11", ".csv") == path
+    assert file_cache.get("aa11", ".csv") == path
+    assert file_cache.contains("aa11", ".csv")  # Not counted
+    assert file_cache.get("bb22", ".csv") is None
+
+    stats = file_cache.stats()
+    assert (stats["hits"], stats["misses"]) == (2, 2)
+    assert stats["hit_rate"] == 0.5
+    assert stats["bytes"] == 4
+
+
+def test_file_cache_evicts_least_recently_used_over_budget(file_cache, tmp_path):
+    first = _put(file_cache, tmp_path, "aa11", 4, mtime=1_000)
+    second = _put(file_cache, tmp_path, "bb22", 4, mtime=2_000)
+    assert file_cache.get("aa11", ".csv") == first  # Now the most recently used
+
+    third = _put(file_cache, tmp_path, "cc33", 4)
+
+    assert os.path.exists(first)
+    assert not os.path.exists(second)
+    assert os.path.exists(third)
+    assert file_cache.size() == 8
+    assert file_cache.stats()["evictions"] == 1
+
+
+def test_file_cache_keeps_a_new_file_larger_than_the_budget(file_cache, tmp_path):
+    old = _put(file_cache, tmp_path, "aa11", 4, mtime=1_000)
+    large = _put(file_cache, tmp_path, "bb22", 12)
+
+    assert not os.path.exists(old)
+    assert os.path.exists(large)
+
+
+def test_result_cache_evicts_least_recently_used_over_budget():
+    cache = ResultCache(max_bytes=10)
+    cache.put("a", "A", 4)
+    cache.put("b", "B", 4)
+    assert cache.get("a") == "A"  # Now the most recently used
+
+    cache.put("c", "C", 4)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "A"
+    assert cache.get("c") == "C"
+    stats = cache.stats()
+    assert (stats["entries"], stats["bytes"], stats["evictions"]) == (2, 8, 1)
+
+
+def test_result_cache_counts_hits_and_misses():
+    cache = ResultCache(max_bytes=10)
+    assert cache.get("a") is None
+    cache.put("a", "A", 4)
+    assert cache.get("a") == "A"
+    assert cache.get("a") == "A"
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (2, 1)
+    assert stats["hit_rate"] == pytest.approx(2 / 3)
+
+
+def test_result_cache_replaces_entries_and_skips_oversized_results():
+    cache = ResultCache(max_bytes=10)
+    cache.put("a", "A", 4)
+    cache.put("a", "A2", 6)
+    cache.put("big", "BIG", 11)
+
+    assert cache.get("a") == "A2"
+    assert cache.get("big") is None
+    assert cache.bytes == 6
+
+    cache.clear()
+    assert cache.get("a") is None
+    assert cache.bytes == 0
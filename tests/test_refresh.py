@@ -0,0 +1,366 @@
+import decimal
+import gzip
+import hashlib
+import json
+import os
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import pyarrow as pa
+import pytest
+from huggingface_hub import DatasetCardData
+
+from huggingduck import connection
+from huggingduck.connection import HuggingDuckDBConnection
+
+
+class LocalRepoConnection(HuggingDuckDBConnection):
+    """Reads the "repo" from a local directory, with the commit and file ids the Hub would report."""
+
+    def __init__(self, repo_dir, failing=(), card_data=None, **kwargs):
+        self.repo_dir = repo_dir
+        self.repo_commit = "a" * 40
+        self.failing = set(failing)  # Files whose downloads fail
+        self.card_data = card_data
+        super().__init__("local/repo", **kwargs)
+
+    def _fetch_repo_files(self):
+        files = {}
+        for path in sorted(self.repo_dir.rglob("*")):
+            if path.is_file():
+                content = path.read_bytes()
+                files[path.relative_to(self.repo_dir).as_posix()] = {
+                    "file_size": len(content),
+                    "blob_id": hashlib.sha1(content).hexdigest(),
+                    "lfs_oid": None,
+                }
+        if self.configs:
+            return self.repo_commit, self._config_files(files, self.card_data)
+        return self.repo_commit, self._group_files(files) if self.group_files else files
+
+    def _remote_path(self, file):
+        return str(self.repo_dir / file)
+
+    def _source_path(self, file, file_info=None, download=True):
+        if file in self.failing:
+            raise OSError(f"Could not download {file}")
+        return super()._source_path(file, file_info, download)
+
+
+def _write_csv(repo_dir, name, rows):
+    lines = ["id,name"] + [f"{i},name_{i}" for i in range(rows)]
+    (repo_dir / name).write_text("\n".join(lines) + "\n")
+
+
+def _row_count(hdb, table_name):
+    return hdb.con.execute(f"SELECT count(*) FROM {table_name}").fetchone()[0]
+
+
+@pytest.fixture
+def repo_dir(tmp_path):
+    repo_dir = tmp_path / "repo"
+    repo_dir.mkdir()
+    _write_csv(repo_dir, "kept.csv", 3)
+    _write_csv(repo_dir, "changed.csv", 3)
+    _write_csv(repo_dir, "deleted.csv", 3)
+    return repo_dir
+
+
+def test_refresh_is_a_no_op_at_the_same_commit(repo_dir):
+    hdb = LocalRepoConnection(repo_dir)
+    assert hdb.refresh() == {"added": [], "changed": [], "deleted": []}
+
+
+def test_refresh_reloads_only_added_changed_and_deleted_files(repo_dir):
+    hdb = LocalRepoConnection(repo_dir)
+    loaded_at = hdb.con.execute(
+        "SELECT loaded_at FROM metadata WHERE file_name = 'kept.csv'"
+    ).fetchone()[0]
+
+    _write_csv(repo_dir, "changed.csv", 5)
+    _write_csv(repo_dir, "added.csv", 2)
+    os.remove(repo_dir / "deleted.csv")
+    hdb.repo_commit = "b" * 40
+
+    assert hdb.refresh() == {
+        "added": ["added.csv"],
+        "changed": ["changed.csv"],
+        "deleted": ["deleted.csv"],
+    }
+    assert _row_count(hdb, "changed") == 5
+    assert _row_count(hdb, "added") == 2
+    assert "deleted" not in hdb.get_table_names()
+    assert hdb.con.execute(
+        "SELECT loaded_at FROM metadata WHERE file_name = 'kept.csv'"
+    ).fetchone()[0] == loaded_at
+    assert hdb.con.execute("SELECT DISTINCT commit_sha FROM metadata").fetchall() == [
+        ("b" * 40,)
+    ]
+
+
+def test_refresh_retries_failed_files_at_the_same_commit(repo_dir):
+    hdb = LocalRepoConnection(repo_dir, failing={"changed.csv"})
+    assert hdb.con.execute(
+        "SELECT table_name, is_loaded FROM metadata WHERE file_name = 'changed.csv'"
+    ).fetchone() == (None, False)
+
+    hdb.failing.clear()
+
+    assert hdb.refresh()["changed"] == ["changed.csv"]
+    assert _row_count(hdb, "changed") == 3
+    assert hdb.refresh() == {"added": [], "changed": [], "deleted": []}
+
+
+def test_refresh_drops_stale_tables_without_a_recorded_table_name(repo_dir, tmp_path):
+    db_path = str(tmp_path / "repo.duckdb")
+    hdb = LocalRepoConnection(repo_dir, db_path=db_path)
+    # As migrated from a database that predates the table_name and blob_id columns
+    hdb.con.execute(
+        "UPDATE metadata SET table_name = NULL, blob_id = NULL, commit_sha = NULL WHERE file_name = 'changed.csv'"
+    )
+    _write_csv(repo_dir, "changed.csv", 5)
+
+    assert hdb.refresh()["changed"] == ["changed.csv"]
+    assert _row_count(hdb, "changed") == 5
+
+
+def test_csv_schema_manifest_records_empty_quote_and_escape(repo_dir):
+    (repo_dir / "semicolons.csv").write_bytes(b"id;name\r\n1;a\r\n2;b\r\n")
+    hdb = LocalRepoConnection(repo_dir)
+
+    assert _row_count(hdb, "kept") == 3
+    assert _row_count(hdb, "semicolons") == 2
+    assert hdb.con.execute(
+        "SELECT DISTINCT quote, escape FROM csv_schemas"
+    ).fetchall() == [("", "")]
+
+
+def test_lazy_views_are_sniffed_when_materialized(repo_dir):
+    hdb = LocalRepoConnection(repo_dir, lazy=True)
+    assert hdb.con.execute("SELECT count(*) FROM csv_schemas").fetchone()[0] == 0
+
+    hdb.materialize("kept")
+
+    assert hdb.con.execute("SELECT count(*) FROM csv_schemas").fetchone()[0] == 1
+    assert hdb.con.execute(
+        "SELECT reader, row_count FROM metadata WHERE table_name = 'kept'"
+    ).fetchone() == ("read_csv (schema manifest)", 3)
+
+
+@pytest.fixture
+def datasets_cache_dir(tmp_path, monkeypatch):
+    """A datasets cache holding a build of local/repo with a train split of 10 rows, with the Hub offline."""
+
+    class OfflineApi:
+        def dataset_info(self, repo_id):
+            raise OSError("offline")
+
+    monkeypatch.setattr(connection, "HfApi", OfflineApi)
+    build_dir = tmp_path / "datasets" / "local___repo" / "default" / "0.0.0" / "abc123"
+    build_dir.mkdir(parents=True)
+    info = {"dataset_name": "repo", "config_name": "default", "splits": {"train": {}}}
+    (build_dir / "dataset_info.json").write_text(json.dumps(info))
+    table = pa.table({"id": list(range(10))})
+    with pa.OSFile(str(build_dir / "repo-train.arrow"), "wb") as sink:
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+    return str(tmp_path / "datasets")
+
+
+def test_datasets_cache_views_can_be_streamed(datasets_cache_dir):
+    hdb = HuggingDuckDBConnection(
+        "local/repo", datasets_cache=True, datasets_cache_dir=datasets_cache_dir
+    )
+
+    assert hdb.query("SELECT count(*) AS n FROM train")["n"][0] == 10
+    assert hdb.query_batches("SELECT * FROM train").read_all().num_rows == 10
+    assert sum(len(chunk) for chunk in hdb.iter_query("SELECT * FROM train", chunk_size=4)) == 10
+
+
+def test_materialize_invalidates_cached_results(repo_dir):
+    hdb = LocalRepoConnection(repo_dir, lazy=True, result_cache_bytes=1024**2)
+    sql = "SELECT is_loaded, row_count FROM metadata ORDER BY file_name"  # Names no lazy table
+    assert hdb.query_arrow(sql).to_pylist()[2] == {"is_loaded": False, "row_count": None}
+
+    hdb.materialize("kept")
+
+    assert hdb.query_arrow(sql).to_pylist()[2] == {"is_loaded": True, "row_count": 3}
+
+
+@pytest.mark.parametrize("sample_method", ["random", "hash"])
+def test_sample_is_taken_of_the_filtered_rows(repo_dir, sample_method):
+    lines = ["id,grp"] + [f"{i},{'ab'[i % 2]}" for i in range(1000)]
+    (repo_dir / "groups.csv").write_text("\n".join(lines) + "\n")
+    hdb = LocalRepoConnection(
+        repo_dir,
+        sample_rows=100,
+        sample_method=sample_method,
+        table_specs={"groups": {"columns": ["id"], "where": "grp = 'a'"}},
+    )
+
+    assert hdb.con.execute("SELECT count(*), count(DISTINCT id % 2) FROM groups").fetchone() == (100, 1)
+    assert hdb.con.execute("SELECT column_name FROM (DESCRIBE groups)").fetchall() == [("id",)]
+
+
+def test_compact_types_narrow_integers_to_signed_types(repo_dir):
+    hdb = LocalRepoConnection(repo_dir, compact_types=True)
+
+    assert hdb.con.execute("SELECT typeof(id) FROM kept LIMIT 1").fetchone() == ("TINYINT",)
+    assert hdb.con.execute("SELECT min(-id), min(id - 2) FROM kept").fetchone() == (-2, -2)
+
+
+def test_partitioned_files_are_grouped_apart_from_their_neighbours(repo_dir):
+    for year in (2024, 2025):
+        (repo_dir / "sales" / f"year={year}").mkdir(parents=True)
+        _write_csv(repo_dir / "sales" / f"year={year}", "part-0.csv", 2)
+    _write_csv(repo_dir / "sales", "extra.csv", 4)
+    hdb = LocalRepoConnection(repo_dir)
+
+    assert hdb.con.execute("SELECT year, count(*) FROM sales GROUP BY year ORDER BY year").fetchall() == [
+        (2024, 2),
+        (2025, 2),
+    ]
+    assert _row_count(hdb, "extra") == 4
+
+
+def test_decimal_parameters_keep_their_type_in_prepared_statements(repo_dir):
+    hdb = LocalRepoConnection(repo_dir)
+    sql = "SELECT typeof(?) AS type, ?::VARCHAR AS value"
+
+    for value, expected in [
+        ("1.50", {"type": "DECIMAL(3,2)", "value": "1.50"}),
+        ("-0.001", {"type": "DECIMAL(4,3)", "value": "-0.001"}),
+        ("1E+2", {"type": "DECIMAL(3,0)", "value": "100"}),
+    ]:
+        params = [decimal.Decimal(value)] * 2
+        assert hdb.query_arrow(sql, params).to_pylist() == [expected]
+    assert hdb.query_arrow(sql, [decimal.Decimal("NaN")] * 2).to_pylist()[0]["value"] == "nan"
+
+
+def test_configs_load_the_splits_of_the_dataset_card(repo_dir):
+    card_data = DatasetCardData(
+        configs=[
+            {"config_name": "default", "data_files": [{"split": "train", "path": "kept.csv"}]},
+            {
+                "config_name": "extended",
+                "data_files": [
+                    {"split": "train", "path": ["kept.csv", "changed.csv"]},
+                    {"split": "test", "path": "deleted.csv"},
+                ],
+            },
+        ]
+    )
+    hdb = LocalRepoConnection(repo_dir, card_data=card_data, configs=["extended"])
+
+    assert sorted(hdb.get_table_names()) == ["extended_test", "extended_train"]
+    assert _row_count(hdb, "extended_train") == 6
+    assert _row_count(hdb, "extended_test") == 3
+
+
+def test_lazy_tables_are_materialized_on_first_query(repo_dir):
+    hdb = LocalRepoConnection(repo_dir, lazy=True)
+    assert hdb.con.execute(
+        "SELECT count(*) FROM duckdb_views() WHERE view_name IN ('kept', 'changed', 'deleted')"
+    ).fetchone() == (3,)
+
+    assert hdb.query("SELECT count(*) AS n FROM kept")["n"][0] == 3
+
+    assert hdb.con.execute("SELECT table_name FROM duckdb_tables() WHERE table_name = 'kept'").fetchall() == [
+        ("kept",)
+    ]
+    assert hdb.con.execute(
+        "SELECT table_name FROM metadata WHERE is_loaded ORDER BY table_name"
+    ).fetchall() == [("kept",)]
+
+
+def test_threads_query_through_their_own_cursors(repo_dir):
+    hdb = LocalRepoConnection(repo_dir)
+    barrier = threading.Barrier(4)  # Keeps every thread alive until all of them have queried
+
+    def count_rows(limit):
+        count = hdb.query("SELECT count(*) AS n FROM kept WHERE id < ?", [limit])["n"][0]
+        barrier.wait()
+        return count, id(hdb._thread_con())
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(count_rows, [0, 1, 2, 3]))
+
+    assert [count for count, _ in results] == [0, 1, 2, 3]
+    assert len({cursor for _, cursor in results}) == 4
+
+
+def test_parquet_conversion_shards_are_grouped_by_config_and_split():
+    files = {
+        file: {"file_size": 10, "blob_id": file, "lfs_oid": None}
+        for file in [
+            "default/train/0000.parquet",
+            "default/train/0001.parquet",
+            "corrected-v1/test/0000.parquet",
+            "README.md",
+        ]
+    }
+
+    groups = HuggingDuckDBConnection._group_parquet_shards(files)
+
+    assert {group: info["table_name"] for group, info in groups.items()} == {
+        "default/train": "train",
+        "corrected-v1/test": "corrected_v1_test",
+    }
+    assert groups["default/train"]["file_size"] == 20
+    assert groups["default/train"]["revision"] == connection.PARQUET_BRANCH
+
+
+def test_table_specs_project_filter_and_limit_at_ingest(repo_dir):
+    _write_csv(repo_dir, "people.csv", 10)
+    hdb = LocalRepoConnection(
+        repo_dir, table_specs={"people": {"columns": ["name"], "where": "id >= 5", "limit": 3}}
+    )
+
+    assert hdb.con.execute("SELECT * FROM people ORDER BY name").fetchall() == [
+        ("name_5",),
+        ("name_6",),
+        ("name_7",),
+    ]
+    assert _row_count(hdb, "kept") == 3  # Tables without a spec are loaded whole
+
+
+def test_shards_are_loaded_as_one_table(repo_dir):
+    (repo_dir / "data").mkdir()
+    _write_csv(repo_dir / "data", "train-00000-of-00002.csv", 2)
+    _write_csv(repo_dir / "data", "train-00001-of-00002.csv", 3)
+    hdb = LocalRepoConnection(repo_dir)
+
+    assert _row_count(hdb, "train") == 5
+    assert hdb.con.execute(
+        "SELECT file_name FROM metadata WHERE table_name = 'train'"
+    ).fetchall() == [("data/train-?????-of-00002*.csv",)]
+
+
+def test_compressed_and_archived_files_are_read_with_their_format_reader(repo_dir):
+    content = (repo_dir / "kept.csv").read_bytes()
+    (repo_dir / "gzipped.csv.gz").write_bytes(gzip.compress(content))
+    with zipfile.ZipFile(repo_dir / "archive.zip", "w") as archive:
+        archive.writestr("part-1.csv", content)
+        archive.writestr("part-2.csv", content)
+        archive.writestr("__MACOSX/._part-1.csv", b"")
+    hdb = LocalRepoConnection(repo_dir)
+
+    assert _row_count(hdb, "gzipped") == 3
+    assert _row_count(hdb, "archive") == 6
+    assert hdb.con.execute(
+        "SELECT reader FROM metadata WHERE table_name = 'archive'"
+    ).fetchone()[0].startswith("zip: read_csv")
+
+
+def test_datasets_cache_views_are_shared_across_threads(datasets_cache_dir):
+    hdb = HuggingDuckDBConnection(
+        "local/repo", datasets_cache=True, datasets_cache_dir=datasets_cache_dir
+    )
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        count = executor.submit(lambda: hdb.query("SELECT count(*) AS n FROM train")["n"][0]).result()
+
+    assert count == 10
+    assert hdb.get_table_names() == ["train"]
+    assert hdb.con.execute("SELECT reader FROM metadata").fetchone() == ("arrow_ipc (memory-mapped view)",)